@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Concurrent-client load test: one stdio server per client vs shared HTTP servers.
+
+Starts ``--clients`` MCP sessions against each serving mode, then has every
+session call ``--tool`` ``--calls`` times at once, and prints JSON with:
+
+- server_processes: MCP server processes, each with its own Temporal client
+  and Mongo pool
+- connect_s: time until every session is initialized (for stdio this
+  includes starting the server processes)
+- p50/p99 latency and ops/s while all clients are calling
+
+Modes are ``stdio`` (a server subprocess per client, as when every agent host
+launches its own) and ``http:<processes>`` (one streamable HTTP server with
+that many processes; more than one runs stateless). Reads are served
+directly from MongoDB by default, so Temporal is not needed; with the default
+in-memory mongomock each server process has its own empty database, so use
+--mongo-uri with a real mongod for meaningful Mongo-bound numbers.
+
+    python -m benchmarks.bench_http --clients 32 --calls 50 --modes stdio,http:1,http:4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16, help="concurrent MCP sessions")
+    parser.add_argument("--calls", type=int, default=50, help="tool calls per session")
+    parser.add_argument("--modes", default="stdio,http:1,http:4", help="comma-separated serving modes")
+    parser.add_argument("--tool", default="health_check")
+    parser.add_argument("--arguments", default="{}", help="tool arguments as JSON")
+    parser.add_argument("--mongo-uri", default="mongomock://", help="MongoDB URI (default: in-memory mongomock)")
+    parser.add_argument("--read-mode", choices=["workflow", "direct"], default="direct")
+    parser.add_argument("--temporal-address", default=os.getenv("TEMPORAL_ADDRESS", "localhost:7233"))
+    parser.add_argument("--port", type=int, default=8765, help="port for the HTTP server")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    return parser.parse_args()
+
+
+def server_env(args):
+    return {
+        "MONGO_URI": args.mongo_uri,
+        "READ_MODE": args.read_mode,
+        "TEMPORAL_ADDRESS": args.temporal_address,
+    }
+
+
+def summarize(latencies, errors, wall_seconds):
+    latencies = sorted(latencies)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(0.50), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / wall_seconds, 1),
+    }
+
+
+async def load(make_client, args):
+    """Open ``args.clients`` sessions, then run every session's calls at once."""
+    arguments = json.loads(args.arguments)
+    latencies = []
+    errors = 0
+    ready = 0
+    all_ready = asyncio.Event()
+    go = asyncio.Event()
+
+    async def one_client():
+        nonlocal errors, ready
+        client = make_client()
+        await client.connect()
+        try:
+            ready += 1
+            if ready == args.clients:
+                all_ready.set()
+            await go.wait()
+            for _ in range(args.calls):
+                start = time.perf_counter()
+                result = await client.call_tool(args.tool, arguments)
+                latencies.append(time.perf_counter() - start)
+                if "error" in result or result.get("status") == "unhealthy":
+                    errors += 1
+        finally:
+            await client.disconnect()
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(one_client()) for _ in range(args.clients)]
+    waiter = asyncio.create_task(all_ready.wait())
+    # Fail fast if a session cannot connect instead of waiting forever
+    await asyncio.wait([waiter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    if not all_ready.is_set():
+        waiter.cancel()
+        await asyncio.gather(*tasks)
+    connect_seconds = time.perf_counter() - start
+
+    go.set()
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return {"connect_s": round(connect_seconds, 2), **summarize(latencies, errors, time.perf_counter() - start)}
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"HTTP server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"HTTP server did not listen on port {port} within {timeout}s")
+
+
+async def run_mode(mode, args):
+    from mcp_client.mcp_client import MCPClient
+
+    if mode == "stdio":
+        # stdio_client only passes a minimal environment, so set it explicitly
+        command = ["env", *(f"{k}={v}" for k, v in server_env(args).items()),
+                   sys.executable, "-m", "mcp_server.main"]
+        result = await load(lambda: MCPClient(server_command=command), args)
+        return {"server_processes": args.clients, **result}
+
+    processes = int(mode.partition(":")[2] or 1)
+    command = [sys.executable, "-m", "mcp_server.main", "--transport", "streamable-http",
+               "--port", str(args.port), "--processes", str(processes)]
+    if processes > 1:
+        command.append("--stateless")
+    server = subprocess.Popen(command, env={**os.environ, **server_env(args)},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port, server)
+        url = f"http://127.0.0.1:{args.port}/mcp"
+        result = await load(lambda: MCPClient(server_url=url), args)
+        return {"server_processes": processes, **result}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+async def run(args):
+    results = {}
+    for mode in args.modes.split(","):
+        if mode != "stdio" and not mode.startswith("http"):
+            raise SystemExit(f"Unknown mode: {mode}")
+        print(f"Load testing {mode} with {args.clients} clients...", file=sys.stderr)
+        results[mode] = await run_mode(mode, args)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "clients": args.clients,
+            "calls": args.calls,
+            "tool": args.tool,
+            "read_mode": args.read_mode,
+            "mongo": "mongomock" if args.mongo_uri.startswith("mongomock://") else "mongodb",
+        },
+        "results": results,
+    }
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
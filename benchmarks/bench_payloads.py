@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Payload size and serialization time per workflow type, for each payload codec.
+
+Runs each workflow's activity against MongoDB (in-memory mongomock by default)
+to get realistic results, then encodes and decodes the payloads that workflow
+writes to Temporal history (workflow input, activity input, activity result,
+workflow result) with every codec. No Temporal server is needed; use
+bench_pipeline's history_bytes to measure whole histories on a real server.
+
+    python -m benchmarks.bench_payloads --repeat 200 --output payloads.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="mongomock://", help="MongoDB URI (default: in-memory mongomock)")
+    parser.add_argument("--accounts", type=int, default=1000, help="accounts seeded for list/analytics results")
+    parser.add_argument("--batch-size", type=int, default=500, help="operations in the batch_deposit sample")
+    parser.add_argument("--repeat", type=int, default=200, help="encode/decode rounds timed per payload set")
+    parser.add_argument("--codecs", default="none,zlib,zstd", help="comma-separated codecs to compare")
+    parser.add_argument("--threshold", type=int, help="compression threshold in bytes (default: PAYLOAD_COMPRESSION_THRESHOLD)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    return parser.parse_args()
+
+
+def workflow_result(result):
+    """The AccountOperationResult a single-activity workflow returns for ``result``."""
+    from mcp_server.workflows import AccountOperationResult
+    return AccountOperationResult(success=result.get("success", False), data=result, error=result.get("error", ""))
+
+
+def build_samples(args, prefix):
+    """Workflow type -> (workflow args, activity args, activity result, workflow result)."""
+    from mcp_server import activities
+    from mcp_server.workflows import AccountOperationResult
+
+    users = [f"{prefix}{i:06d}" for i in range(args.accounts)]
+    for i, user in enumerate(users):
+        activities.create_account_activity(user, 100.0 + i)
+    for i in range(20):
+        activities.deposit_activity(users[0], 1.0 + i)
+
+    def single(activity, *call_args):
+        result = activity(*call_args)
+        return list(call_args), list(call_args), result, workflow_result(result)
+
+    deposits = [{"username": users[i % len(users)], "amount": 1.0} for i in range(args.batch_size)]
+    batch_results = activities.batch_deposit_activity(deposits)
+    succeeded = sum(1 for result in batch_results if result["success"])
+    return {
+        "CreateAccountWorkflow": single(activities.create_account_activity, f"{prefix}new", 100.0),
+        "GetAccountWorkflow": single(activities.get_account_activity, users[0]),
+        "DepositWorkflow": single(activities.deposit_activity, users[1], 10.0, uuid.uuid4().hex),
+        "WithdrawWorkflow": single(activities.withdraw_activity, users[1], 5.0, uuid.uuid4().hex),
+        "TransferWorkflow": single(activities.transfer_activity, users[1], users[2], 1.0, uuid.uuid4().hex),
+        "ListAccountsWorkflow": single(activities.list_accounts_activity, 100, ""),
+        "GetTransactionsWorkflow": single(activities.get_transactions_activity, users[0], "", 100, ""),
+        "AccountStatsWorkflow": single(activities.get_account_stats_activity),
+        "TopAccountsWorkflow": single(activities.top_accounts_activity, 10),
+        "BalanceHistogramWorkflow": single(activities.balance_histogram_activity, 10, None),
+        "BatchDepositWorkflow": (
+            [deposits], [deposits], batch_results,
+            AccountOperationResult(success=True, data={
+                "results": batch_results, "succeeded": succeeded, "failed": len(batch_results) - succeeded
+            })
+        ),
+        "HealthCheckWorkflow": single(activities.health_check_activity),
+    }
+
+
+async def measure(converter, sample, repeat):
+    """Encoded bytes and mean encode/decode time of one workflow's history payloads."""
+    workflow_args, activity_args, activity_result, result = sample
+    value_sets = [workflow_args, activity_args, [activity_result], [result]]
+    encoded = [await converter.encode(values) for values in value_sets]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for values in value_sets:
+            await converter.encode(values)
+    encode_seconds = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payloads in encoded:
+            await converter.decode(payloads)
+    decode_seconds = (time.perf_counter() - start) / repeat
+
+    return {
+        "payload_bytes": sum(payload.ByteSize() for payloads in encoded for payload in payloads),
+        "encode_us": round(encode_seconds * 1_000_000, 1),
+        "decode_us": round(decode_seconds * 1_000_000, 1),
+    }
+
+
+async def run(args):
+    # Configure the data layer before mcp_server is imported
+    os.environ["MONGO_URI"] = args.mongo_uri
+
+    from mcp_server import codec
+    from mcp_server.database import get_db
+
+    db = get_db()
+    db.ensure_indexes()
+    prefix = f"bench-{uuid.uuid4().hex[:6]}-"
+    codecs = args.codecs.split(",")
+    converters = {name: codec.data_converter(name, args.threshold) for name in codecs}
+    try:
+        samples = build_samples(args, prefix)
+        results = {}
+        for workflow_type, sample in samples.items():
+            results[workflow_type] = {
+                name: await measure(converter, sample, args.repeat)
+                for name, converter in converters.items()
+            }
+    finally:
+        db.accounts.delete_many({"username": {"$regex": f"^{prefix}"}})
+        db.transactions.delete_many({"username": {"$regex": f"^{prefix}"}})
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "accounts": args.accounts,
+            "batch_size": args.batch_size,
+            "repeat": args.repeat,
+            # What each codec actually used, e.g. zstd falls back to zlib without zstandard
+            "codecs": {name: converter.payload_codec.algorithm for name, converter in converters.items()},
+            "threshold": codec.PAYLOAD_COMPRESSION_THRESHOLD if args.threshold is None else args.threshold,
+        },
+        "results": results,
+    }
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
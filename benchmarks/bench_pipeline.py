@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Latency and throughput benchmark for the MCP tool -> Temporal -> Mongo pipeline.
+
+Calls every tool in mcp_server.main directly, with a Temporal worker running
+in-process. Temporal is the time-skipping test server by default and MongoDB is
+an in-memory mongomock stand-in, so no external services are needed. Use
+--temporal-address and --mongo-uri to benchmark against real deployments.
+
+    python -m benchmarks.bench_pipeline --ops 500 --concurrency 32 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from temporalio import client as temporal_client
+
+SEED_BALANCE = 1_000_000_000.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=200, help="calls per tool")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight at once")
+    parser.add_argument("--accounts", type=int, default=100, help="accounts used by get/deposit/withdraw/transfer")
+    parser.add_argument("--list-sizes", default="100,1000,10000",
+                        help="comma-separated collection sizes for list_accounts, which fetches the last page")
+    parser.add_argument("--tools", default="create_account,get_account,deposit,withdraw,transfer,list_accounts,health_check",
+                        help="comma-separated tools to benchmark")
+    parser.add_argument("--temporal", choices=["time-skipping", "local"], default="time-skipping",
+                        help="ephemeral Temporal server to start when --temporal-address is not given")
+    parser.add_argument("--temporal-address", help="use an existing Temporal server instead")
+    parser.add_argument("--mongo-uri", default="mongomock://", help="MongoDB URI (default: in-memory mongomock)")
+    parser.add_argument("--read-mode", choices=["workflow", "direct"], default="workflow")
+    parser.add_argument("--activity-threads", type=int, default=100)
+    parser.add_argument("--payload-codec", choices=["none", "zlib", "zstd"], default="none",
+                        help="payload codec for the client and worker (see mcp_server/codec.py)")
+    parser.add_argument("--local-activities", default="",
+                        help="workflow types whose activity runs as a local activity, or 'short' (see mcp_server/worker.py)")
+    parser.add_argument("--history-samples", type=int, default=20,
+                        help="workflows per type whose history size is measured")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    return parser.parse_args()
+
+
+def summarize(latencies, errors, wall_seconds):
+    latencies = sorted(latencies)
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(0.50), 3),
+        "p99_ms": round(percentile(0.99), 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "ops_per_sec": round(len(latencies) / wall_seconds, 1),
+    }
+
+
+async def measure(make_call, ops, concurrency):
+    """Run ``make_call(i)`` ``ops`` times with at most ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            result = await make_call(i)
+            latencies.append(time.perf_counter() - start)
+            if isinstance(result, dict) and ("error" in result or result.get("status") == "unhealthy"):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(ops)])
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+class WorkflowIdRecorder(temporal_client.Interceptor):
+    """Client interceptor that remembers the ID of every workflow started, by type."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def intercept_client(self, next):
+        return _RecordingOutbound(next, self.ids)
+
+
+class _RecordingOutbound(temporal_client.OutboundInterceptor):
+    def __init__(self, next, ids):
+        super().__init__(next)
+        self._ids = ids
+
+    async def start_workflow(self, input):
+        self._ids.setdefault(input.workflow, []).append(input.id)
+        return await super().start_workflow(input)
+
+
+async def history_sizes(client, ids_by_type, samples):
+    """Mean and max serialized history size of the last ``samples`` workflows of each type."""
+    sizes = {}
+    for workflow_type, ids in sorted(ids_by_type.items()):
+        totals = []
+        for workflow_id in ids[-samples:]:
+            history = await client.get_workflow_handle(workflow_id).fetch_history()
+            totals.append(sum(event.ByteSize() for event in history.events))
+        sizes[workflow_type] = {
+            "workflows": len(totals),
+            "mean_bytes": round(statistics.mean(totals)),
+            "max_bytes": max(totals),
+        }
+    return sizes
+
+
+def last_page_cursor(db, page_size=100):
+    """Cursor of the collection's last page, found by following next_cursor from the start."""
+    previous, cursor = "", ""
+    while True:
+        accounts, next_cursor = db.list_accounts(page_size, cursor)
+        if not accounts:
+            return previous
+        if not next_cursor:
+            return cursor
+        previous, cursor = cursor, next_cursor
+
+
+def seed_accounts(db, prefix, count):
+    db.accounts.delete_many({"username": {"$regex": f"^{prefix}"}})
+    for start in range(0, count, 1000):
+        db.accounts.insert_many([
+            {"username": f"{prefix}{i:08d}", "balance": SEED_BALANCE}
+            for i in range(start, min(count, start + 1000))
+        ])
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+async def run(args):
+    # Configure the data layer before mcp_server is imported
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["READ_MODE"] = args.read_mode
+    os.environ["PAYLOAD_CODEC"] = args.payload_codec
+
+    from temporalio.client import Client
+    from temporalio.testing import WorkflowEnvironment
+    from temporalio.worker import Worker
+    from mcp_server import main as server
+    from mcp_server.codec import data_converter
+    from mcp_server.warmup import workflow_runner
+    from mcp_server.database import get_db
+    from mcp_server.interceptors import LocalActivityInterceptor
+    from mcp_server.worker import WORKFLOWS, ACTIVITIES, SHORT_WORKFLOWS
+    from mcp_server.task_queues import TASK_QUEUES
+
+    db = get_db()
+    db.ensure_indexes()
+    tools = args.tools.split(",")
+    rng = random.Random(42)
+    run_id = uuid.uuid4().hex[:6]
+    prefix = f"bench-{run_id}-"
+    seed_accounts(db, prefix, args.accounts)
+    usernames = [f"{prefix}{i:08d}" for i in range(args.accounts)]
+
+    env = None
+    if args.temporal_address:
+        client = await Client.connect(args.temporal_address)
+    elif args.temporal == "local":
+        env = await WorkflowEnvironment.start_local()
+        client = env.client
+    else:
+        env = await WorkflowEnvironment.start_time_skipping()
+        client = env.client
+    # Same connection, plus the payload codec and a recorder for history sizes
+    recorder = WorkflowIdRecorder()
+    config = client.config()
+    client = Client(**{
+        **config,
+        "data_converter": data_converter(),
+        "interceptors": [*config["interceptors"], recorder],
+    })
+    server.temporal_client = client
+
+    calls = {
+        "create_account": lambda i: server.create_account(f"{prefix}new-{i}", 100.0),
+        "get_account": lambda i: server.get_account(rng.choice(usernames)),
+        "deposit": lambda i: server.deposit(rng.choice(usernames), 1.0),
+        "withdraw": lambda i: server.withdraw(rng.choice(usernames), 1.0),
+        "transfer": lambda i: server.transfer(*rng.sample(usernames, 2), 1.0),
+        "health_check": lambda i: server.health_check(),
+    }
+
+    local_activities = [name for name in args.local_activities.split(",") if name]
+    if local_activities == ["short"]:
+        local_activities = SHORT_WORKFLOWS
+    interceptors = [LocalActivityInterceptor(local_activities)] if local_activities else []
+
+    results = {}
+    activity_executor = ThreadPoolExecutor(max_workers=args.activity_threads)
+    try:
+        async with AsyncExitStack() as stack:
+            # Serve every configured task queue (just one unless TASK_QUEUE_* is set)
+            for task_queue in set(TASK_QUEUES.values()):
+                await stack.enter_async_context(Worker(
+                    client,
+                    task_queue=task_queue,
+                    workflows=WORKFLOWS,
+                    activities=ACTIVITIES,
+                    activity_executor=activity_executor,
+                    workflow_runner=workflow_runner(),
+                    interceptors=interceptors,
+                    max_concurrent_activities=args.activity_threads,
+                ))
+            for tool in tools:
+                if tool == "list_accounts":
+                    for size in [int(n) for n in args.list_sizes.split(",")]:
+                        list_prefix = f"bench-{run_id}-list{size}-"
+                        seed_accounts(db, list_prefix, size)
+                        # The first page costs the same at any size; the last
+                        # one shows whether paging stays flat as the collection grows
+                        cursor = last_page_cursor(db)
+                        print(f"Benchmarking list_accounts last page over {size} extra accounts...", file=sys.stderr)
+                        results[f"list_accounts[{size}]"] = await measure(
+                            lambda i: server.list_accounts(cursor=cursor), args.ops, args.concurrency
+                        )
+                        db.accounts.delete_many({"username": {"$regex": f"^{list_prefix}"}})
+                elif tool in calls:
+                    print(f"Benchmarking {tool}...", file=sys.stderr)
+                    results[tool] = await measure(calls[tool], args.ops, args.concurrency)
+                else:
+                    raise SystemExit(f"Unknown tool: {tool}")
+            history_bytes = await history_sizes(client, recorder.ids, args.history_samples)
+    finally:
+        activity_executor.shutdown(wait=False)
+        db.accounts.delete_many({"username": {"$regex": f"^{prefix}"}})
+        if env:
+            await env.shutdown()
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "ops": args.ops,
+            "concurrency": args.concurrency,
+            "accounts": args.accounts,
+            "temporal": args.temporal_address or args.temporal,
+            "mongo": "mongomock" if args.mongo_uri.startswith("mongomock://") else "mongodb",
+            "read_mode": args.read_mode,
+            "activity_threads": args.activity_threads,
+            "payload_codec": args.payload_codec,
+            "local_activities": local_activities,
+        },
+        "results": results,
+        "history_bytes": history_bytes,
+    }
+
+
+def main():
+    args = parse_args()
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
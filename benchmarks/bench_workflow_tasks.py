@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Workflow task CPU time and cold-start latency for the worker's sandbox settings.
+
+Replays synthetic first workflow tasks (see mcp_server/warmup.py) with the
+Temporal Replayer, so no Temporal server or MongoDB is needed. Each
+configuration runs in a fresh process and reports:
+
+- import_ms: importing the worker module
+- first_task_ms: the first workflow task after start-up (and after the
+  prewarm, when enabled), i.e. the cold-start cost a real task would pay
+- per-workflow cpu_ms / wall_ms: mean cost of a first task once warm; each
+  one starts a new workflow run, so it includes the sandbox's per-run setup
+
+    python -m benchmarks.bench_workflow_tasks --tasks 200 --output workflow_tasks.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import time
+from datetime import datetime, timezone
+
+# name -> (sandbox passthrough, prewarm); "unsandboxed" is a lower bound
+CONFIGS = {
+    "sandbox": (False, False),
+    "sandbox+passthrough": (True, False),
+    "sandbox+passthrough+prewarm": (True, True),
+    "unsandboxed": (None, False),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=100, help="workflow tasks replayed per workflow type")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="comma-separated configurations to compare")
+    parser.add_argument("--workflows", help="comma-separated workflow types (default: all)")
+    parser.add_argument("--output", help="write JSON results to this file instead of stdout")
+    return parser.parse_args()
+
+
+async def measure_config(passthrough, prewarm, tasks, workflow_names):
+    start = time.perf_counter()
+    from temporalio.worker import Replayer, UnsandboxedWorkflowRunner
+    from mcp_server import warmup
+    from mcp_server.interceptors import MetricsInterceptor
+    from mcp_server.worker import WORKFLOWS
+    import_ms = (time.perf_counter() - start) * 1000
+
+    workflows = [w for w in WORKFLOWS if not workflow_names or w.__name__ in workflow_names]
+    runner = UnsandboxedWorkflowRunner() if passthrough is None else warmup.workflow_runner(passthrough)
+    interceptors = [MetricsInterceptor()]
+    prewarm_ms = None
+    if prewarm:
+        prewarm_ms = await warmup.prewarm_workflows(workflows, runner, interceptors) * 1000
+
+    replayer = Replayer(workflows=workflows, workflow_runner=runner, interceptors=interceptors)
+    start = time.perf_counter()
+    await replayer.replay_workflow(warmup.warmup_history(workflows[0], "first"))
+    first_task_ms = (time.perf_counter() - start) * 1000
+
+    per_workflow = {}
+    for workflow_class in workflows:
+        histories = [warmup.warmup_history(workflow_class, f"{workflow_class.__name__}-{i}") for i in range(tasks)]
+
+        async def iterate():
+            for history in histories:
+                yield history
+
+        cpu, wall = time.process_time(), time.perf_counter()
+        await replayer.replay_workflows(iterate())
+        per_workflow[workflow_class.__name__] = {
+            "cpu_ms": round((time.process_time() - cpu) / tasks * 1000, 3),
+            "wall_ms": round((time.perf_counter() - wall) / tasks * 1000, 3),
+        }
+    return {
+        "import_ms": round(import_ms, 1),
+        "prewarm_ms": None if prewarm_ms is None else round(prewarm_ms, 1),
+        "first_task_ms": round(first_task_ms, 1),
+        "mean_cpu_ms": round(sum(r["cpu_ms"] for r in per_workflow.values()) / len(per_workflow), 3),
+        "workflows": per_workflow,
+    }
+
+
+def run_config(name, tasks, workflow_names):
+    passthrough, prewarm = CONFIGS[name]
+    return asyncio.run(measure_config(passthrough, prewarm, tasks, workflow_names))
+
+
+def main():
+    args = parse_args()
+    workflow_names = set(args.workflows.split(",")) if args.workflows else None
+    results = {}
+    # A fresh process per configuration, so cold-start numbers are really cold
+    context = multiprocessing.get_context("spawn")
+    for name in args.configs.split(","):
+        if name not in CONFIGS:
+            raise SystemExit(f"Unknown configuration: {name}")
+        with context.Pool(1) as pool:
+            results[name] = pool.apply(run_config, (name, args.tasks, workflow_names))
+    report = json.dumps({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {"tasks": args.tasks, "workflows": args.workflows or "all"},
+        "results": results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
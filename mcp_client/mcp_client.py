@@ -1,40 +1,69 @@
 import asyncio
+import atexit
+import concurrent.futures
 import json
+import os
 import subprocess
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional
 from contextlib import AsyncExitStack
+import anyio
+import httpx
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+# Failures that mean the session itself is gone rather than one call failing:
+# a closed or broken transport, or an MCP error reporting the connection
+# closed or, over streamable HTTP, the server no longer knowing the session
+_TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream,
+                     httpx.TransportError, OSError)
+_SESSION_GONE_CODES = {CONNECTION_CLOSED, 32600}
 
 class MCPClient:
-    """MCP client for connecting to the money transfer server."""
+    """MCP client for connecting to the money transfer server.
+
+    Starts the server as a stdio subprocess, or connects over streamable HTTP
+    to ``server_url`` (default MCP_SERVER_URL, e.g. http://localhost:8000/mcp).
+    """
 
-    def __init__(self, server_command: list = None):
+    def __init__(self, server_command: list = None, server_url: str = None):
         if server_command is None:
             server_command = ["uv", "run", "-m", "mcp_server.main"]
         self.server_command = server_command
+        self.server_url = server_url or os.getenv("MCP_SERVER_URL")
         self.session: Optional[ClientSession] = None
         self.exit_stack: Optional[AsyncExitStack] = None
+        # Set once a call finds the transport dead; the session cannot recover
+        self.broken = False
 
     async def connect(self):
         """Connect to the MCP server."""
         self.exit_stack = AsyncExitStack()
 
-        # Start server as subprocess
-        server_params = StdioServerParameters(
-            command=self.server_command[0],
-            args=self.server_command[1:],
-            env=None
-        )
-
-        # Create stdio client
-        stdio_transport = await self.exit_stack.enter_async_context(
-            stdio_client(server_params)
-        )
+        if self.server_url:
+            # Connect to a running HTTP server
+            read_stream, write_stream, _ = await self.exit_stack.enter_async_context(
+                streamablehttp_client(self.server_url)
+            )
+        else:
+            # Start server as subprocess
+            server_params = StdioServerParameters(
+                command=self.server_command[0],
+                args=self.server_command[1:],
+                env=None
+            )
+
+            # Create stdio client
+            read_stream, write_stream = await self.exit_stack.enter_async_context(
+                stdio_client(server_params)
+            )
 
         # Create session
         self.session = await self.exit_stack.enter_async_context(
-            ClientSession(stdio_transport[0], stdio_transport[1])
+            ClientSession(read_stream, write_stream)
         )
 
         # Initialize the session
@@ -58,7 +87,12 @@ class MCPClient:
         if not self.session:
             raise RuntimeError("Not connected to MCP server")
 
-        result = await self.session.call_tool(tool_name, arguments)
+        try:
+            result = await self.session.call_tool(tool_name, arguments)
+        except Exception as e:
+            if isinstance(e, _TRANSPORT_ERRORS) or (isinstance(e, McpError) and e.error.code in _SESSION_GONE_CODES):
+                self.broken = True
+            raise
         if result.content:
             content = result.content[0].text
             try:
@@ -72,8 +106,8 @@ class MCPClient:
 class MCPToolsClient:
     """Tool implementations using MCP client."""
 
-    def __init__(self):
-        self.client = MCPClient()
+    def __init__(self, server_command: list = None, server_url: str = None):
+        self.client = MCPClient(server_command, server_url)
 
     async def __aenter__(self):
         await self.client.connect()
@@ -103,14 +137,60 @@ class MCPToolsClient:
         except Exception as e:
             return {"error": f"Failed to get account: {str(e)}"}
 
-    async def list_accounts(self) -> Dict[str, Any]:
-        """List all accounts in the system."""
+    async def list_accounts(self, limit: int = 100, cursor: str = "") -> Dict[str, Any]:
+        """List one page of accounts; pass back next_cursor to get the next page."""
         try:
-            result = await self.client.call_tool("list_accounts", {})
+            result = await self.client.call_tool("list_accounts", {
+                "limit": limit,
+                "cursor": cursor
+            })
             return result
         except Exception as e:
             return {"error": f"Failed to list accounts: {str(e)}"}
 
+    async def get_transactions(self, username: str, since: str = "", limit: int = 100,
+                               cursor: str = "") -> Dict[str, Any]:
+        """List an account's ledger entries, oldest first; pass back next_cursor for more."""
+        try:
+            result = await self.client.call_tool("get_transactions", {
+                "username": username,
+                "since": since,
+                "limit": limit,
+                "cursor": cursor
+            })
+            return result
+        except Exception as e:
+            return {"error": f"Failed to get transactions: {str(e)}"}
+
+    async def get_account_stats(self) -> Dict[str, Any]:
+        """Number of accounts and the total, min, max and mean balance."""
+        try:
+            result = await self.client.call_tool("get_account_stats", {})
+            return result
+        except Exception as e:
+            return {"error": f"Failed to get account stats: {str(e)}"}
+
+    async def top_accounts(self, n: int = 10) -> Dict[str, Any]:
+        """The n accounts with the largest balances, highest first."""
+        try:
+            result = await self.client.call_tool("top_accounts", {
+                "n": n
+            })
+            return result
+        except Exception as e:
+            return {"error": f"Failed to get top accounts: {str(e)}"}
+
+    async def balance_histogram(self, buckets: int = 10, boundaries: List[float] = None) -> Dict[str, Any]:
+        """Count accounts per balance range."""
+        try:
+            result = await self.client.call_tool("balance_histogram", {
+                "buckets": buckets,
+                "boundaries": boundaries
+            })
+            return result
+        except Exception as e:
+            return {"error": f"Failed to get balance histogram: {str(e)}"}
+
     async def delete_account(self, username: str) -> Dict[str, Any]:
         """Delete the account with the given username."""
         try:
@@ -121,40 +201,69 @@ class MCPToolsClient:
         except Exception as e:
             return {"error": f"Failed to delete account: {str(e)}"}
 
-    async def deposit(self, username: str, amount: float) -> Dict[str, Any]:
+    async def deposit(self, username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
         """Deposit money into the specified account."""
         try:
-            result = await self.client.call_tool("deposit", {
+            arguments = {
                 "username": username,
                 "amount": amount
-            })
+            }
+            if idempotency_key:
+                arguments["idempotency_key"] = idempotency_key
+            result = await self.client.call_tool("deposit", arguments)
             return result
         except Exception as e:
             return {"error": f"Failed to deposit: {str(e)}"}
 
-    async def withdraw(self, username: str, amount: float) -> Dict[str, Any]:
+    async def withdraw(self, username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
         """Withdraw money from the specified account."""
         try:
-            result = await self.client.call_tool("withdraw", {
+            arguments = {
                 "username": username,
                 "amount": amount
-            })
+            }
+            if idempotency_key:
+                arguments["idempotency_key"] = idempotency_key
+            result = await self.client.call_tool("withdraw", arguments)
             return result
         except Exception as e:
             return {"error": f"Failed to withdraw: {str(e)}"}
 
-    async def transfer(self, from_user: str, to_user: str, amount: float) -> Dict[str, Any]:
+    async def transfer(self, from_user: str, to_user: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
         """Transfer money from one account to another."""
         try:
-            result = await self.client.call_tool("transfer", {
+            arguments = {
                 "from_user": from_user,
                 "to_user": to_user,
                 "amount": amount
-            })
+            }
+            if idempotency_key:
+                arguments["idempotency_key"] = idempotency_key
+            result = await self.client.call_tool("transfer", arguments)
             return result
         except Exception as e:
             return {"error": f"Failed to transfer: {str(e)}"}
 
+    async def batch_deposit(self, deposits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Deposit into many accounts; each item is {"username", "amount"}."""
+        try:
+            result = await self.client.call_tool("batch_deposit", {
+                "deposits": deposits
+            })
+            return result
+        except Exception as e:
+            return {"error": f"Failed to batch deposit: {str(e)}"}
+
+    async def batch_transfer(self, transfers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply many transfers in order; each item is {"from_user", "to_user", "amount"}."""
+        try:
+            result = await self.client.call_tool("batch_transfer", {
+                "transfers": transfers
+            })
+            return result
+        except Exception as e:
+            return {"error": f"Failed to batch transfer: {str(e)}"}
+
     async def get_balance(self, username: str) -> Dict[str, Any]:
         """Get the current balance for the specified account."""
         try:
@@ -176,6 +285,158 @@ class MCPToolsClient:
             return {"error": f"Health check failed: {str(e)}"}
 
 
+# How long a pooled session waits before reconnecting, doubling per failure
+RECONNECT_INITIAL_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 30.0
+# How long a sync call waits for an idle session, and for its whole result
+ACQUIRE_TIMEOUT_SECONDS = 30.0
+CALL_TIMEOUT_SECONDS = 120.0
+
+class MCPClientPool:
+    """Long-lived pool of MCP sessions shared by the synchronous API.
+
+    A background thread runs an event loop that owns ``size`` connected
+    MCPToolsClient instances. Each sync call borrows an idle session, so the
+    server subprocess and MCP handshake (or HTTP session) are paid once per session
+    rather than once per call. A session whose transport dies is dropped and
+    reconnected with backoff. Safe to use from any number of threads.
+    """
+
+    def __init__(self, size: int = 4, server_command: list = None, server_url: str = None,
+                 acquire_timeout: float = ACQUIRE_TIMEOUT_SECONDS,
+                 call_timeout: float = CALL_TIMEOUT_SECONDS):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.call_timeout = call_timeout
+        self.server_command = server_command
+        self.server_url = server_url
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="mcp-client-pool", daemon=True
+        )
+        self._thread.start()
+        self._closed = False
+        try:
+            asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        except BaseException:
+            self.close()
+            raise
+
+    async def _start(self):
+        self._idle = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        # Live client -> event that tells its holder task to reconnect it
+        self._holders = {}
+        loop = asyncio.get_running_loop()
+        ready = [loop.create_future() for _ in range(self.size)]
+        self._tasks = [asyncio.create_task(self._hold_session(r)) for r in ready]
+        await asyncio.gather(*ready)
+
+    async def _hold_session(self, ready: asyncio.Future):
+        # The stdio transport must be entered and exited by the same task, so
+        # each session lives inside its own task until the pool is closed,
+        # which also replaces the session whenever it dies.
+        delay = RECONNECT_INITIAL_SECONDS
+        while not self._stopping.is_set():
+            retire = asyncio.Event()
+            client = None
+            try:
+                async with MCPToolsClient(self.server_command, self.server_url) as client:
+                    self._holders[client] = retire
+                    self._idle.put_nowait(client)
+                    if not ready.done():
+                        ready.set_result(None)
+                    delay = RECONNECT_INITIAL_SECONDS
+                    waits = [asyncio.create_task(self._stopping.wait()), asyncio.create_task(retire.wait())]
+                    try:
+                        await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for wait in waits:
+                            wait.cancel()
+            except Exception as e:
+                if not ready.done():
+                    # The first connect fails the pool instead of retrying
+                    ready.set_exception(e)
+                    return
+            finally:
+                self._holders.pop(client, None)
+            if not self._stopping.is_set():
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+    async def _call(self, func, *args):
+        try:
+            client = await asyncio.wait_for(self._acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            return {"error": f"No MCP session became available within {self.acquire_timeout}s"}
+        finished = False
+        try:
+            result = await func(client, *args)
+            finished = True
+            return result
+        finally:
+            retire = self._holders.get(client)
+            if retire is None:
+                pass  # its holder noticed first and is already reconnecting
+            elif client.client.broken or not finished:
+                # A call cancelled mid-request may still get its reply later
+                retire.set()
+            else:
+                self._idle.put_nowait(client)
+
+    async def _acquire(self):
+        while True:
+            client = await self._idle.get()
+            # Skip sessions whose holder has already dropped them
+            if client in self._holders:
+                return client
+
+    def call(self, func, *args):
+        """Run ``func(client, *args)`` on a pooled session and return its result."""
+        if self._closed:
+            raise RuntimeError("MCP client pool is closed")
+        future = asyncio.run_coroutine_threadsafe(self._call(func, *args), self._loop)
+        try:
+            return future.result(timeout=self.call_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return {"error": f"MCP call timed out after {self.call_timeout}s"}
+
+    def close(self):
+        """Disconnect every session and stop the background loop."""
+        if self._closed:
+            return
+        self._closed = True
+
+        async def shutdown():
+            if hasattr(self, "_stopping"):
+                self._stopping.set()
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout=10)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=10)
+
+
+_pool: Optional[MCPClientPool] = None
+_pool_lock = threading.Lock()
+
+def get_client_pool() -> MCPClientPool:
+    """Return the shared pool, starting it on first use (MCP_CLIENT_POOL_SIZE sessions)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = MCPClientPool(
+                int(os.getenv("MCP_CLIENT_POOL_SIZE", "4")),
+                acquire_timeout=float(os.getenv("MCP_CLIENT_ACQUIRE_TIMEOUT_SECONDS", str(ACQUIRE_TIMEOUT_SECONDS))),
+                call_timeout=float(os.getenv("MCP_CLIENT_CALL_TIMEOUT_SECONDS", str(CALL_TIMEOUT_SECONDS)))
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
 # Synchronous wrapper functions for backward compatibility
 def run_async_tool(coro):
     """Run an async tool function synchronously."""
@@ -194,54 +455,64 @@ async def with_mcp_client(func, *args, **kwargs):
 # Synchronous tool functions that use MCP
 def create_account_sync(username: str, balance: float = 0.0) -> Dict[str, Any]:
     """Create a new account with the given username and initial balance."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u, b: client.create_account(u, b), username, balance)
-    )
+    return get_client_pool().call(lambda client, u, b: client.create_account(u, b), username, balance)
 
 def get_account_sync(username: str) -> Dict[str, Any]:
     """Get account information for the given username."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u: client.get_account(u), username)
-    )
+    return get_client_pool().call(lambda client, u: client.get_account(u), username)
 
-def list_accounts_sync() -> Dict[str, Any]:
-    """List all accounts in the system."""
-    return run_async_tool(
-        with_mcp_client(lambda client: client.list_accounts())
+def list_accounts_sync(limit: int = 100, cursor: str = "") -> Dict[str, Any]:
+    """List one page of accounts; pass back next_cursor to get the next page."""
+    return get_client_pool().call(lambda client, l, c: client.list_accounts(l, c), limit, cursor)
+
+def get_transactions_sync(username: str, since: str = "", limit: int = 100, cursor: str = "") -> Dict[str, Any]:
+    """List an account's ledger entries, oldest first; pass back next_cursor for more."""
+    return get_client_pool().call(
+        lambda client, u, s, l, c: client.get_transactions(u, s, l, c), username, since, limit, cursor
     )
 
+def get_account_stats_sync() -> Dict[str, Any]:
+    """Number of accounts and the total, min, max and mean balance."""
+    return get_client_pool().call(lambda client: client.get_account_stats())
+
+def top_accounts_sync(n: int = 10) -> Dict[str, Any]:
+    """The n accounts with the largest balances, highest first."""
+    return get_client_pool().call(lambda client, n: client.top_accounts(n), n)
+
+def balance_histogram_sync(buckets: int = 10, boundaries: List[float] = None) -> Dict[str, Any]:
+    """Count accounts per balance range."""
+    return get_client_pool().call(lambda client, b, bs: client.balance_histogram(b, bs), buckets, boundaries)
+
 def delete_account_sync(username: str) -> Dict[str, Any]:
     """Delete the account with the given username."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u: client.delete_account(u), username)
-    )
+    return get_client_pool().call(lambda client, u: client.delete_account(u), username)
 
-def deposit_sync(username: str, amount: float) -> Dict[str, Any]:
+def deposit_sync(username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
     """Deposit money into the specified account."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u, a: client.deposit(u, a), username, amount)
-    )
+    return get_client_pool().call(lambda client, u, a, k: client.deposit(u, a, k), username, amount, idempotency_key)
 
-def withdraw_sync(username: str, amount: float) -> Dict[str, Any]:
+def withdraw_sync(username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
     """Withdraw money from the specified account."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u, a: client.withdraw(u, a), username, amount)
-    )
+    return get_client_pool().call(lambda client, u, a, k: client.withdraw(u, a, k), username, amount, idempotency_key)
 
-def transfer_sync(from_user: str, to_user: str, amount: float) -> Dict[str, Any]:
+def transfer_sync(from_user: str, to_user: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
     """Transfer money from one account to another."""
-    return run_async_tool(
-        with_mcp_client(lambda client, f, t, a: client.transfer(f, t, a), from_user, to_user, amount)
+    return get_client_pool().call(
+        lambda client, f, t, a, k: client.transfer(f, t, a, k), from_user, to_user, amount, idempotency_key
     )
 
+def batch_deposit_sync(deposits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Deposit into many accounts; each item is {"username", "amount"}."""
+    return get_client_pool().call(lambda client, d: client.batch_deposit(d), deposits)
+
+def batch_transfer_sync(transfers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply many transfers in order; each item is {"from_user", "to_user", "amount"}."""
+    return get_client_pool().call(lambda client, t: client.batch_transfer(t), transfers)
+
 def get_balance_sync(username: str) -> Dict[str, Any]:
     """Get the current balance for the specified account."""
-    return run_async_tool(
-        with_mcp_client(lambda client, u: client.get_balance(u), username)
-    )
+    return get_client_pool().call(lambda client, u: client.get_balance(u), username)
 
 def health_check_sync() -> Dict[str, Any]:
     """Check the health of the MCP server."""
-    return run_async_tool(
-        with_mcp_client(lambda client: client.health_check())
-    )
\ No newline at end of file
+    return get_client_pool().call(lambda client: client.health_check())
\ No newline at end of file
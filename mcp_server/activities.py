@@ -1,11 +1,14 @@
 from temporalio import activity
+from temporalio.exceptions import ApplicationError
 from pymongo.errors import DuplicateKeyError
-from .database import get_db
-from typing import Dict, Any, List
+from .database import get_db, DEFAULT_PAGE_SIZE, OperationOutcomeUnknown
+from .models import amount_error, to_money
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 
 
 @activity.defn
-async def create_account_activity(username: str, balance: float = 0.0) -> Dict[str, Any]:
+def create_account_activity(username: str, balance: float = 0.0) -> Dict[str, Any]:
     try:
         db = get_db()
         success = db.create_account(username, balance)
@@ -13,7 +16,7 @@ async def create_account_activity(username: str, balance: float = 0.0) -> Dict[s
             return {
                 "success": True,
                 "username": username,
-                "balance": balance,
+                "balance": float(to_money(balance)),
                 "message": "Account created successfully"
             }
         else:
@@ -26,13 +29,19 @@ async def create_account_activity(username: str, balance: float = 0.0) -> Dict[s
             "success": False,
             "error": "Username already exists"
         }
+    except ValueError as e:
+        # An opening balance that is not a number; retrying cannot fix it
+        return {
+            "success": False,
+            "error": str(e)
+        }
     except Exception as e:
         activity.logger.error(f"Error creating account: {str(e)}")
         raise
 
 
 @activity.defn
-async def delete_account_activity(username: str) -> Dict[str, Any]:
+def delete_account_activity(username: str) -> Dict[str, Any]:
     try:
         db = get_db()
         success = db.delete_account(username)
@@ -53,7 +62,7 @@ async def delete_account_activity(username: str) -> Dict[str, Any]:
 
 
 @activity.defn
-async def get_account_activity(username: str) -> Dict[str, Any]:
+def get_account_activity(username: str) -> Dict[str, Any]:
     try:
         db = get_db()
         account = db.get_account(username)
@@ -74,99 +83,169 @@ async def get_account_activity(username: str) -> Dict[str, Any]:
 
 
 @activity.defn
-async def list_accounts_activity() -> List[Dict[str, Any]]:
+def list_accounts_activity(limit: int = DEFAULT_PAGE_SIZE, cursor: str = "") -> Dict[str, Any]:
     try:
         db = get_db()
-        accounts = db.list_accounts()
-        return [{"username": acc["username"], "balance": acc["balance"]} for acc in accounts]
+        try:
+            accounts, next_cursor = db.list_accounts(limit, cursor)
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        return {
+            "success": True,
+            "accounts": accounts,
+            "next_cursor": next_cursor
+        }
     except Exception as e:
         activity.logger.error(f"Error listing accounts: {str(e)}")
         raise
 
 
 @activity.defn
-async def deposit_activity(username: str, amount: float) -> Dict[str, Any]:
+def get_transactions_activity(username: str, since: str = "", limit: int = DEFAULT_PAGE_SIZE,
+                              cursor: str = "") -> Dict[str, Any]:
     try:
-        if amount <= 0:
-            return {
-                "success": False,
-                "error": "Amount must be positive"
-            }
-        
         db = get_db()
-        account = db.get_account(username)
-        if not account:
+        try:
+            since_time = datetime.fromisoformat(since) if since else None
+            entries, next_cursor = db.get_transactions(username, since_time, limit, cursor)
+        except ValueError as e:
             return {
                 "success": False,
-                "error": "Account not found"
+                "error": str(e) if cursor else "since must be an ISO 8601 timestamp"
             }
-        
-        new_balance = account["balance"] + amount
-        success = db.update_balance(username, new_balance)
-        if success:
-            return {
-                "success": True,
-                "message": f"Deposited ${amount} to {username}",
-                "from_balance": new_balance
-            }
-        else:
+        return {
+            "success": True,
+            "username": username,
+            "transactions": entries,
+            "next_cursor": next_cursor
+        }
+    except Exception as e:
+        activity.logger.error(f"Error getting transactions: {str(e)}")
+        raise
+
+
+@activity.defn
+def get_account_stats_activity() -> Dict[str, Any]:
+    try:
+        db = get_db()
+        return {"success": True, **db.account_stats()}
+    except Exception as e:
+        activity.logger.error(f"Error computing account stats: {str(e)}")
+        raise
+
+
+@activity.defn
+def top_accounts_activity(n: int = 10) -> Dict[str, Any]:
+    try:
+        db = get_db()
+        return {"success": True, "accounts": db.top_accounts(n)}
+    except Exception as e:
+        activity.logger.error(f"Error getting top accounts: {str(e)}")
+        raise
+
+
+@activity.defn
+def balance_histogram_activity(buckets: int = 10, boundaries: Optional[List[float]] = None) -> Dict[str, Any]:
+    try:
+        db = get_db()
+        try:
+            histogram = db.balance_histogram(buckets, boundaries)
+        except ValueError as e:
             return {
                 "success": False,
-                "error": "Failed to deposit funds"
+                "error": str(e)
             }
+        return {"success": True, **histogram}
     except Exception as e:
-        activity.logger.error(f"Error depositing funds: {str(e)}")
+        activity.logger.error(f"Error computing balance histogram: {str(e)}")
         raise
 
 
+def _run_once(db, idempotency_key: str, operation):
+    # Without a key the operation runs as-is; with one, a retried call returns
+    # the result recorded by the first successful execution. An attempt still
+    # holding the key raises OperationInProgress, which the retry policy retries
+    if not idempotency_key:
+        return operation(None)
+    try:
+        return db.run_idempotent(idempotency_key, operation)
+    except OperationOutcomeUnknown as e:
+        raise ApplicationError(str(e), type="OperationOutcomeUnknown", non_retryable=True) from e
+
+
 @activity.defn
-async def withdraw_activity(username: str, amount: float) -> Dict[str, Any]:
+def deposit_activity(username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
     try:
-        if amount <= 0:
+        error = amount_error(amount)
+        if error:
             return {
                 "success": False,
-                "error": "Amount must be positive"
+                "error": error
             }
         
         db = get_db()
-        account = db.get_account(username)
-        if not account:
+        def deposit(session):
+            account = db.deposit(username, amount, session=session)
+            if not account:
+                return {
+                    "success": False,
+                    "error": "Account not found"
+                }
+            
             return {
-                "success": False,
-                "error": "Account not found"
+                "success": True,
+                "message": f"Deposited ${to_money(amount)} to {username}",
+                "from_balance": account["balance"]
             }
         
-        if account["balance"] < amount:
+        return _run_once(db, idempotency_key and f"deposit:{idempotency_key}", deposit)
+    except Exception as e:
+        activity.logger.error(f"Error depositing funds: {str(e)}")
+        raise
+
+
+@activity.defn
+def withdraw_activity(username: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
+    try:
+        error = amount_error(amount)
+        if error:
             return {
                 "success": False,
-                "error": "Insufficient funds"
+                "error": error
             }
         
-        new_balance = account["balance"] - amount
-        success = db.update_balance(username, new_balance)
-        if success:
+        db = get_db()
+        def withdraw(session):
+            account, error = db.withdraw(username, amount, session=session)
+            if not account:
+                return {
+                    "success": False,
+                    "error": error
+                }
+            
             return {
                 "success": True,
-                "message": f"Withdrew ${amount} from {username}",
-                "from_balance": new_balance
-            }
-        else:
-            return {
-                "success": False,
-                "error": "Failed to withdraw funds"
+                "message": f"Withdrew ${to_money(amount)} from {username}",
+                "from_balance": account["balance"]
             }
+        
+        return _run_once(db, idempotency_key and f"withdraw:{idempotency_key}", withdraw)
     except Exception as e:
         activity.logger.error(f"Error withdrawing funds: {str(e)}")
         raise
 
 
 @activity.defn
-async def transfer_activity(from_user: str, to_user: str, amount: float) -> Dict[str, Any]:
+def transfer_activity(from_user: str, to_user: str, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
     try:
-        if amount <= 0:
+        error = amount_error(amount)
+        if error:
             return {
                 "success": False,
-                "error": "Amount must be positive"
+                "error": error
             }
         
         if from_user == to_user:
@@ -176,32 +255,120 @@ async def transfer_activity(from_user: str, to_user: str, amount: float) -> Dict
             }
         
         db = get_db()
-        success, message = db.transfer_funds(from_user, to_user, amount)
-        if success:
-            from_account = db.get_account(from_user)
-            to_account = db.get_account(to_user)
-            return {
-                "success": True,
-                "message": message,
-                "from_balance": from_account["balance"],
-                "to_balance": to_account["balance"]
-            }
-        else:
-            return {
-                "success": False,
-                "error": message
-            }
+        def transfer(session):
+            success, message, from_account, to_account = db.transfer_funds(
+                from_user, to_user, amount, session=session
+            )
+            if success:
+                return {
+                    "success": True,
+                    "message": message,
+                    "from_balance": from_account["balance"],
+                    "to_balance": to_account["balance"]
+                }
+            else:
+                return {
+                    "success": False,
+                    "error": message
+                }
+        
+        return _run_once(db, idempotency_key and f"transfer:{idempotency_key}", transfer)
     except Exception as e:
         activity.logger.error(f"Error transferring funds: {str(e)}")
         raise
 
 
 @activity.defn
-async def health_check_activity() -> Dict[str, Any]:
+def apply_account_operations_activity(username: str, operations: List[Dict[str, Any]],
+                                      batch_key: str) -> Dict[str, Any]:
+    """Apply one AccountWorkflow batch; ``batch_key`` makes a retried batch apply once."""
     try:
+        db = get_db()
+        def apply(session):
+            applied = db.apply_account_operations(username, operations, session=session)
+            if applied is None:
+                return {
+                    "success": False,
+                    "error": "Account not found"
+                }
+            return {"success": True, **applied}
+        
+        return _run_once(db, batch_key, apply)
+    except Exception as e:
+        activity.logger.error(f"Error applying account operations: {str(e)}")
+        raise
+
+
+def _invalid_batch_item(item: Dict[str, Any], fields: List[str]) -> str:
+    if not isinstance(item, dict) or any(not isinstance(item.get(f), str) for f in fields):
+        return "Invalid operation"
+    amount = item.get("amount")
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)):
+        return "Amount must be positive"
+    return amount_error(amount)
+
+
+@activity.defn
+def batch_deposit_activity(deposits: List[Dict[str, Any]], chunk_key: str = "") -> List[Dict[str, Any]]:
+    """Apply one chunk of a batch deposit; ``chunk_key`` makes a retried chunk apply once."""
+    try:
+        errors = [_invalid_batch_item(item, ["username"]) for item in deposits]
+        valid = [i for i, error in enumerate(errors) if not error]
+        
+        db = get_db()
+        def apply(session):
+            results = [{"success": False, "error": error} if error else None for error in errors]
+            applied = db.batch_deposit(
+                [(deposits[i]["username"], deposits[i]["amount"]) for i in valid], session=session
+            )
+            for i, result in zip(valid, applied):
+                results[i] = result
+            return results
+        
+        return _run_once(db, chunk_key, apply)
+    except Exception as e:
+        activity.logger.error(f"Error applying batch deposit: {str(e)}")
+        raise
+
+
+@activity.defn
+def batch_transfer_activity(transfers: List[Dict[str, Any]], chunk_key: str = "") -> List[Dict[str, Any]]:
+    """Apply one chunk of a batch transfer; ``chunk_key`` makes a retried chunk apply once."""
+    try:
+        errors = []
+        for item in transfers:
+            error = _invalid_batch_item(item, ["from_user", "to_user"])
+            if not error and item["from_user"] == item["to_user"]:
+                error = "Cannot transfer to the same account"
+            errors.append(error)
+        valid = [i for i, error in enumerate(errors) if not error]
+        
+        db = get_db()
+        def apply(session):
+            results = [{"success": False, "error": error} if error else None for error in errors]
+            applied = db.batch_transfer([
+                (transfers[i]["from_user"], transfers[i]["to_user"], transfers[i]["amount"])
+                for i in valid
+            ], session=session)
+            for i, result in zip(valid, applied):
+                results[i] = result
+            return results
+        
+        return _run_once(db, chunk_key, apply)
+    except Exception as e:
+        activity.logger.error(f"Error applying batch transfer: {str(e)}")
+        raise
+
+
+@activity.defn
+def health_check_activity() -> Dict[str, Any]:
+    try:
+        db = get_db()
         return {
             "status": "healthy",
-            "service": "MCP Money Transfer Server (Temporal)"
+            "service": "MCP Money Transfer Server (Temporal)",
+            "account_cache": db.cache_stats(),
+            "mongo_pool": db.pool_stats()
         }
     except Exception as e:
         activity.logger.error(f"Error in health check: {str(e)}")
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class AccountCache:
+    """Thread-safe LRU cache of account documents with a per-entry TTL.
+
+    Entries are keyed by username and also indexed by ``_id`` so change-stream
+    events, which only carry the document key, can invalidate them. Every
+    invalidation bumps the username's generation; a reader takes
+    ``generation()`` before reading Mongo and passes it to ``put``, which
+    drops the document if a write was invalidated in between.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # username -> (expires_at, document)
+        self._usernames_by_id = {}
+        # username -> generation of its last invalidation, bounded like the
+        # entries; forgotten usernames fall back to the floor, which only grows
+        self._generations = OrderedDict()
+        self._generation_floor = 0
+        self._last_generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str):
+        """Return a copy of the cached document, or None on a miss or expiry."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(username)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return dict(entry[1])
+
+    def generation(self, username: str) -> int:
+        with self._lock:
+            return self._generations.get(username, self._generation_floor)
+
+    def put(self, username: str, document: dict, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and self._generations.get(username, self._generation_floor) != generation:
+                # Invalidated since the caller read it, so it may predate that write
+                return
+            self._remove(username)
+            self._entries[username] = (time.monotonic() + self.ttl_seconds, dict(document))
+            if "_id" in document:
+                self._usernames_by_id[document["_id"]] = username
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._bump(username)
+            if self._remove(username):
+                self.invalidations += 1
+
+    def invalidate_id(self, document_id):
+        with self._lock:
+            username = self._usernames_by_id.get(document_id)
+            if username is None:
+                # Not cached, but a read of it may be in flight and we cannot
+                # tell whose it is
+                self._bump_all()
+                return
+            self._bump(username)
+            if self._remove(username):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._usernames_by_id.clear()
+            self._bump_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+    def _bump(self, username: str):
+        # Caller holds the lock
+        self._last_generation += 1
+        self._generations[username] = self._last_generation
+        self._generations.move_to_end(username)
+        while len(self._generations) > self.max_size:
+            _, generation = self._generations.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, generation)
+
+    def _bump_all(self):
+        # Caller holds the lock
+        self._last_generation += 1
+        self._generations.clear()
+        self._generation_floor = self._last_generation
+
+    def _remove(self, username: str) -> bool:
+        # Caller holds the lock
+        entry = self._entries.pop(username, None)
+        if entry is None:
+            return False
+        self._usernames_by_id.pop(entry[1].get("_id"), None)
+        return True
@@ -0,0 +1,89 @@
+"""Temporal payload codec that compresses large workflow and activity payloads.
+
+Every workflow input, activity result and workflow result is stored in
+Temporal history, and list/ledger/batch results repeat the same JSON keys for
+every row. Payloads of at least PAYLOAD_COMPRESSION_THRESHOLD bytes are
+replaced by their binary protobuf serialization compressed with
+PAYLOAD_CODEC (``zstd`` or ``zlib``); smaller ones are left as plain JSON.
+Decoding always understands both encodings, so PAYLOAD_CODEC can be changed
+without breaking histories written under another setting.
+"""
+import dataclasses
+import logging
+import os
+import zlib
+from typing import List, Sequence
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import DataConverter, PayloadCodec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZLIB_ENCODING = b"binary/zlib"
+ZSTD_ENCODING = b"binary/zstd"
+CODECS = ("none", "zlib", "zstd")
+
+PAYLOAD_CODEC = os.getenv("PAYLOAD_CODEC", "none")
+PAYLOAD_COMPRESSION_THRESHOLD = int(os.getenv("PAYLOAD_COMPRESSION_THRESHOLD", "1024"))
+
+
+class CompressionCodec(PayloadCodec):
+    def __init__(self, algorithm: str = "zlib", threshold: int = PAYLOAD_COMPRESSION_THRESHOLD):
+        if algorithm not in CODECS:
+            raise ValueError(f"Unknown payload codec {algorithm!r}, expected one of {', '.join(CODECS)}")
+        if algorithm == "zstd" and zstandard is None:
+            logger.warning("PAYLOAD_CODEC=zstd needs the zstandard package, compressing with zlib instead")
+            algorithm = "zlib"
+        self.algorithm = algorithm
+        self.threshold = threshold
+
+    async def encode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return [self._encode(payload) for payload in payloads]
+
+    async def decode(self, payloads: Sequence[Payload]) -> List[Payload]:
+        return [self._decode(payload) for payload in payloads]
+
+    def _encode(self, payload: Payload) -> Payload:
+        if self.algorithm == "none" or payload.ByteSize() < self.threshold:
+            return payload
+        raw = payload.SerializeToString()
+        if self.algorithm == "zstd":
+            data, encoding = zstandard.ZstdCompressor().compress(raw), ZSTD_ENCODING
+        else:
+            data, encoding = zlib.compress(raw), ZLIB_ENCODING
+        if len(data) >= len(raw):
+            return payload
+        return Payload(metadata={"encoding": encoding}, data=data)
+
+    def _decode(self, payload: Payload) -> Payload:
+        encoding = payload.metadata.get("encoding")
+        if encoding == ZLIB_ENCODING:
+            raw = zlib.decompress(payload.data)
+        elif encoding == ZSTD_ENCODING:
+            if zstandard is None:
+                raise RuntimeError("Payload is zstd-compressed but the zstandard package is not installed")
+            raw = zstandard.ZstdDecompressor().decompress(payload.data)
+        else:
+            return payload
+        decoded = Payload()
+        decoded.ParseFromString(raw)
+        return decoded
+
+
+def data_converter(algorithm: str = None, threshold: int = None) -> DataConverter:
+    """Default JSON data converter with payloads passed through CompressionCodec.
+
+    The MCP server and every worker must use it, since each side decodes what
+    the other encodes.
+    """
+    return dataclasses.replace(
+        DataConverter.default,
+        payload_codec=CompressionCodec(
+            algorithm or PAYLOAD_CODEC,
+            PAYLOAD_COMPRESSION_THRESHOLD if threshold is None else threshold
+        )
+    )
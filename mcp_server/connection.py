@@ -0,0 +1,96 @@
+"""Temporal connection settings shared by the MCP server and the worker.
+
+The endpoint, namespace and TLS come from TEMPORAL_* variables. TLS is on
+when TEMPORAL_TLS=true or any certificate file is given; mTLS needs both
+TEMPORAL_TLS_CLIENT_CERT and TEMPORAL_TLS_CLIENT_KEY. Established connections
+recover on their own: the SDK retries failed RPCs with backoff and keepalives
+detect dead connections. ``connect_with_backoff`` covers the initial connect.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional, Union
+from temporalio.client import Client
+from temporalio.service import TLSConfig
+from . import codec, telemetry
+
+logger = logging.getLogger(__name__)
+
+TEMPORAL_ADDRESS = os.getenv("TEMPORAL_ADDRESS", "localhost:7233")
+TEMPORAL_NAMESPACE = os.getenv("TEMPORAL_NAMESPACE", "default")
+
+# Initial connect retry delays, doubling up to the maximum
+CONNECT_BACKOFF_INITIAL_SECONDS = 0.5
+CONNECT_BACKOFF_MAX_SECONDS = 30.0
+
+
+def _read(path_variable: str) -> Optional[bytes]:
+    path = os.getenv(path_variable)
+    if not path:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def tls_config() -> Union[TLSConfig, bool]:
+    client_cert = _read("TEMPORAL_TLS_CLIENT_CERT")
+    client_key = _read("TEMPORAL_TLS_CLIENT_KEY")
+    server_ca = _read("TEMPORAL_TLS_SERVER_CA")
+    server_name = os.getenv("TEMPORAL_TLS_SERVER_NAME") or None
+    if (client_cert is None) != (client_key is None):
+        raise ValueError("TEMPORAL_TLS_CLIENT_CERT and TEMPORAL_TLS_CLIENT_KEY must be set together")
+    if client_cert or server_ca or server_name:
+        return TLSConfig(
+            client_cert=client_cert,
+            client_private_key=client_key,
+            server_root_ca_cert=server_ca,
+            domain=server_name
+        )
+    return os.getenv("TEMPORAL_TLS", "false").lower() == "true"
+
+
+async def connect(address: Optional[str] = None, namespace: Optional[str] = None,
+                  tls: Union[TLSConfig, bool, None] = None) -> Client:
+    """Connect once, recording the time taken in banking_temporal_connect_duration."""
+    address = address or TEMPORAL_ADDRESS
+    tls = tls_config() if tls is None else tls
+    start = time.perf_counter()
+    outcome = "failed"
+    try:
+        client = await Client.connect(
+            address,
+            namespace=namespace or TEMPORAL_NAMESPACE,
+            tls=tls,
+            data_converter=codec.data_converter(),
+            runtime=telemetry.runtime(),
+            interceptors=telemetry.tracing_interceptors()
+        )
+        outcome = "ok"
+        return client
+    finally:
+        seconds = time.perf_counter() - start
+        telemetry.record_duration(
+            "banking_temporal_connect_duration", "Time to connect to the Temporal frontend",
+            seconds, {"outcome": outcome}
+        )
+        if outcome == "ok":
+            logger.info(f"Connected to Temporal at {address} in {seconds * 1000:.0f} ms")
+
+
+async def connect_with_backoff(address: Optional[str] = None, namespace: Optional[str] = None) -> Client:
+    """Connect, retrying with jittered exponential backoff until it succeeds.
+
+    Bad TLS settings raise straight away, since retrying will not fix them.
+    """
+    tls = tls_config()
+    delay = CONNECT_BACKOFF_INITIAL_SECONDS
+    while True:
+        try:
+            return await connect(address, namespace, tls)
+        except Exception as e:
+            sleep = delay * random.uniform(0.5, 1.0)
+            logger.warning(f"Could not connect to Temporal, retrying in {sleep:.1f}s: {str(e)}")
+            await asyncio.sleep(sleep)
+            delay = min(delay * 2, CONNECT_BACKOFF_MAX_SECONDS)
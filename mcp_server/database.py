@@ -1,80 +1,1055 @@
+import base64
+import binascii
+import bisect
+import logging
 import os
-from pymongo import MongoClient
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal, ROUND_CEILING
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from bson.errors import InvalidId
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
+from .cache import AccountCache
+from .mongo_metrics import PoolMetrics
+from .models import MONEY_QUANTUM, amount_error, to_money
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_TOP_ACCOUNTS = 100
+MAX_HISTOGRAM_BUCKETS = 100
+
+
+def encode_cursor(username: str) -> str:
+    """Opaque continuation token for the page that ends at ``username``."""
+    return base64.urlsafe_b64encode(username.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor.encode(), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def money_to_bson(amount) -> Decimal128:
+    """Decimal128 storage form of an amount, exact to the cent."""
+    return Decimal128(to_money(amount))
+
+
+def money_from_bson(value) -> Decimal:
+    """Exact Decimal for a stored amount; older documents may still hold doubles."""
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return to_money(value)
+
+
+def _public(document: dict) -> dict:
+    # Money leaves the data layer as floats so results stay JSON/Temporal
+    # serializable; all arithmetic happens on Decimal/Decimal128
+    document = dict(document)
+    for field in ("balance", "amount"):
+        if field in document:
+            document[field] = float(money_from_bson(document[field]))
+    return document
+
+
+# MongoClient options that can be set from the environment. Unset variables
+# fall back to the connection string, then to the driver defaults.
+CLIENT_OPTIONS_FROM_ENV = {
+    "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+    "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+    "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+    "maxConnecting": ("MONGO_MAX_CONNECTING", int),
+    "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+    "compressors": ("MONGO_COMPRESSORS", str),
+    "readPreference": ("MONGO_READ_PREFERENCE", str),
+}
+
+
+def client_options() -> dict:
+    options = {
+        "serverSelectionTimeoutMS": 5000,  # 5 seconds
+        "connectTimeoutMS": 5000,          # 5 seconds
+    }
+    for option, (name, convert) in CLIENT_OPTIONS_FROM_ENV.items():
+        value = os.getenv(name)
+        if value:
+            options[option] = convert(value)
+    return options
+
+
+class TransactionAborted(Exception):
+    """Raised inside a transaction callback to roll back with a user-facing reason."""
+
+
+class OperationInProgress(Exception):
+    """Another attempt holds the idempotency key; retry later for its result."""
+
+
+class OperationOutcomeUnknown(Exception):
+    """An attempt without transactions failed after claiming the key, so retrying is unsafe."""
+
+
+class _KeyClaimed(Exception):
+    """Aborts run_idempotent's transaction when the key is already claimed."""
+
 
 class Database:
     def __init__(self):
         self.mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
         self.mongo_db = os.getenv("MONGO_DB", "banking-mcp-demo")
-        self.client = MongoClient(
-            self.mongo_uri,
-            serverSelectionTimeoutMS=5000,  # 5 seconds
-            connectTimeoutMS=5000,          # 5 seconds
-        )
+        # Multi-document transactions need a replica set or mongos. None means
+        # enabled if the server supports them, checked on first use; set
+        # MONGO_TRANSACTIONS=false to skip the check on a standalone mongod.
+        self._use_transactions = None if os.getenv("MONGO_TRANSACTIONS", "true").lower() == "true" else False
+        self.money_to_bson = money_to_bson
+        # Pool and per-command latency stats; MONGO_POOL_METRICS=false disables them
+        self.pool_metrics = None
+        if self.mongo_uri.startswith("mongomock://"):
+            # In-memory stand-in for benchmarks and local runs without mongod
+            import mongomock
+            self.client = mongomock.MongoClient()
+            self.use_transactions = False
+            # mongomock cannot do arithmetic on Decimal128, so store doubles
+            self.money_to_bson = lambda amount: float(to_money(amount))
+        else:
+            listeners = []
+            if os.getenv("MONGO_POOL_METRICS", "true").lower() == "true":
+                self.pool_metrics = PoolMetrics()
+                listeners.append(self.pool_metrics)
+            self.client = MongoClient(self.mongo_uri, event_listeners=listeners, **client_options())
         self.db = self.client[self.mongo_db]
         self.accounts = self.db.accounts
+        # Append-only ledger of every balance change
+        self.transactions = self.db.transactions
+        # Results of operations submitted with an idempotency key, keyed by _id
+        self.idempotency_keys = self.db.idempotency_keys
+        self.idempotency_key_ttl = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "604800"))  # 7 days
+        # Without transactions, a claim older than this with no result belongs
+        # to an attempt that died mid-operation
+        self.idempotency_claim_timeout = int(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", "600"))
+        # Hot accounts keep most of their balance in HOT_ACCOUNT_SHARDS documents
+        # of account_shards, so concurrent deposits update different documents.
+        # The logical balance is the accounts document plus all of its shards.
+        self.account_shards = self.db.account_shards
+        self.hot_accounts = {u.strip() for u in os.getenv("HOT_ACCOUNTS", "").split(",") if u.strip()}
+        self.hot_account_shards = int(os.getenv("HOT_ACCOUNT_SHARDS", "8"))
+        # MongoClient connects in the background, so nothing above touches the
+        # network; indexes are created by ensure_indexes, not on construction
+        self._indexes_ensured = False
         
-        # Create unique index on username
+        # Read-through cache for get_account; ACCOUNT_CACHE_SIZE=0 disables it
+        cache_size = int(os.getenv("ACCOUNT_CACHE_SIZE", "0"))
+        self.account_cache = None
+        # Open transaction session -> usernames to invalidate once it ends
+        self._pending_invalidations = {}
+        if cache_size > 0:
+            self.account_cache = AccountCache(
+                cache_size, float(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "5"))
+            )
+            if os.getenv("ACCOUNT_CACHE_CHANGE_STREAM", "false").lower() == "true":
+                threading.Thread(
+                    target=self._watch, args=(self.accounts, self._invalidate_account_change),
+                    name="account-cache-change-stream", daemon=True
+                ).start()
+                # Hot-account deposits only write account_shards; the lookup
+                # fetches the shard's username, the only field we keep
+                threading.Thread(
+                    target=self._watch, args=(self.account_shards, self._invalidate_shard_change),
+                    kwargs={
+                        "pipeline": [{"$project": {"operationType": 1, "documentKey": 1, "fullDocument.username": 1}}],
+                        "full_document": "updateLookup"
+                    },
+                    name="account-shard-change-stream", daemon=True
+                ).start()
+    
+    @property
+    def use_transactions(self):
+        """Whether writes run in multi-document transactions.
+
+        The first read asks the server with ``hello``; a standalone mongod
+        cannot run transactions, so writes fall back to the non-transactional
+        paths rather than failing. Raises if MongoDB is unreachable, and asks
+        again next time.
+        """
+        if self._use_transactions is None:
+            hello = self.client.admin.command("hello")
+            supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+            if not supported:
+                logger.warning(
+                    "MongoDB is a standalone server, which cannot run transactions; "
+                    "continuing as with MONGO_TRANSACTIONS=false. Use a replica set for atomic transfers."
+                )
+            self._use_transactions = supported
+        return self._use_transactions
+
+    @use_transactions.setter
+    def use_transactions(self, value):
+        self._use_transactions = value
+    
+    def ensure_indexes(self):
+        """Create the indexes the data layer relies on. Safe to call repeatedly.
+
+        ``create_index`` is a no-op for an index that already exists, so this
+        only costs round trips the first time it runs in a process.
+        """
+        if self._indexes_ensured:
+            return
         self.accounts.create_index("username", unique=True)
+        self.transactions.create_index([("username", 1), ("timestamp", 1), ("_id", 1)])
+        self.idempotency_keys.create_index("created_at", expireAfterSeconds=self.idempotency_key_ttl)
+        self.account_shards.create_index([("username", 1), ("shard", 1)], unique=True)
+        # Serves top_accounts' sort without scanning the collection
+        self.accounts.create_index([("balance", -1)])
+        self._ensure_shards(self.hot_accounts)
+        self._indexes_ensured = True
+    
+    def prewarm_pool(self, timeout: float = 10):
+        """Open ``minPoolSize`` connections now instead of on first use.
+
+        The driver fills the pool to ``minPoolSize`` in the background once the
+        client is connected; this connects and waits (up to ``timeout``) for
+        that to finish, watching the pool metrics. Returns the number of open
+        connections, or None when there is nothing to prewarm.
+        """
+        if not self.pool_metrics:
+            return None
+        min_pool_size = self.client.options.pool_options.min_pool_size
+        if not min_pool_size:
+            return None
+        self.client.admin.command("ping")
+        deadline = time.monotonic() + timeout
+        while self.pool_metrics.open_connections < min_pool_size and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.pool_metrics.open_connections
+    
+    def pool_stats(self):
+        if not self.pool_metrics:
+            return {"enabled": False}
+        pool_options = self.client.options.pool_options
+        return {
+            "max_pool_size": pool_options.max_pool_size,
+            "min_pool_size": pool_options.min_pool_size,
+            **self.pool_metrics.snapshot()
+        }
+    
+    def _watch(self, collection, invalidate, **options):
+        """Invalidate cached accounts written by other processes, via ``collection``'s change stream."""
+        while True:
+            try:
+                with collection.watch(**options) as stream:
+                    # Anything cached before the stream opened may already be stale
+                    self.account_cache.clear()
+                    for change in stream:
+                        invalidate(change)
+            except Exception as e:
+                logger.warning(f"Account cache change stream on {collection.name} failed, retrying: {str(e)}")
+                self.account_cache.clear()
+                time.sleep(5)
+    
+    def _invalidate_account_change(self, change):
+        self.account_cache.invalidate_id(change["documentKey"]["_id"])
+    
+    def _invalidate_shard_change(self, change):
+        document = change.get("fullDocument")
+        if document:
+            self.account_cache.invalidate(document["username"])
+        else:
+            # A deleted shard (a fold) no longer says whose it was
+            self.account_cache.clear()
+    
+    def _invalidate(self, *usernames, session=None):
+        """Drop ``usernames`` from the cache, or after the commit when ``session`` is in a transaction.
+
+        Bumping the cache generation before the commit would let a concurrent
+        reader take the new generation, read the old committed balance and
+        cache it for the whole TTL.
+        """
+        if session is not None:
+            pending = self._pending_invalidations.get(session)
+            if pending is not None:
+                pending.update(usernames)
+                return
+        if self.account_cache:
+            for username in usernames:
+                self.account_cache.invalidate(username)
+    
+    def cache_stats(self):
+        return self.account_cache.stats() if self.account_cache else {"enabled": False}
     
     def get_account(self, username: str):
-        return self.accounts.find_one({"username": username})
+        if self.account_cache:
+            account = self.account_cache.get(username)
+            if account is not None:
+                return account
+            # Taken before the read, so a write invalidated meanwhile is not
+            # shadowed by the older document we are about to read
+            generation = self.account_cache.generation(username)
+        account = self.accounts.find_one({"username": username})
+        if account:
+            account = _public(self._with_shard_balances([account])[0])
+            if self.account_cache:
+                self.account_cache.put(username, account, generation)
+        return account
     
     def create_account(self, username: str, balance: float):
-        account = {"username": username, "balance": balance}
-        result = self.accounts.insert_one(account)
-        return result.acknowledged
+        def create(session):
+            account = {"username": username, "balance": self.money_to_bson(balance)}
+            result = self.accounts.insert_one(account, session=session)
+            if username in self.hot_accounts:
+                self._ensure_shards([username], session)
+            if balance:
+                self._record([self._entry(username, "opening_balance", balance, balance)], session)
+            return result.acknowledged
+
+        try:
+            return self._run_transaction(create)
+        finally:
+            self._invalidate(username)
     
     def delete_account(self, username: str):
-        result = self.accounts.delete_one({"username": username})
-        return result.deleted_count > 0
+        try:
+            result = self.accounts.delete_one({"username": username})
+            self.account_shards.delete_many({"username": username})
+            return result.deleted_count > 0
+        finally:
+            self._invalidate(username)
+    
+    def list_accounts(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str = ""):
+        """Return one page of accounts ordered by username and the next cursor.
+
+        Pages are keyed on the unique ``username`` index, so each page is a
+        bounded index range scan. The next cursor is "" after the last page.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = {"username": {"$gt": decode_cursor(cursor)}} if cursor else {}
+        accounts = list(
+            self.accounts.find(query, {"_id": 0, "username": 1, "balance": 1})
+            .sort("username", 1)
+            .limit(limit + 1)
+        )
+        next_cursor = ""
+        if len(accounts) > limit:
+            accounts = accounts[:limit]
+            next_cursor = encode_cursor(accounts[-1]["username"])
+        return [_public(account) for account in self._with_shard_balances(accounts)], next_cursor
+    
+    def _hot_balances(self):
+        """Full balances of existing hot accounts, which aggregations over accounts alone would miss."""
+        if not self.hot_accounts:
+            return {}
+        accounts = list(self.accounts.find(
+            {"username": {"$in": list(self.hot_accounts)}}, {"_id": 0, "username": 1, "balance": 1}
+        ))
+        return {
+            account["username"]: money_from_bson(account["balance"])
+            for account in self._with_shard_balances(accounts)
+        }
     
-    def list_accounts(self):
-        return list(self.accounts.find({}, {"_id": 0}))
+    def _not_hot(self, hot):
+        return {"$match": {"username": {"$nin": list(hot)}}} if hot else {"$match": {}}
     
-    def update_balance(self, username: str, new_balance: float):
-        result = self.accounts.update_one(
-            {"username": username}, 
-            {"$set": {"balance": new_balance}}
+    def account_stats(self):
+        """Account count and total, min, max and mean balance from one ``$group``."""
+        hot = self._hot_balances()
+        row = next(self.accounts.aggregate([
+            self._not_hot(hot),
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "total": {"$sum": "$balance"},
+                "min": {"$min": "$balance"},
+                "max": {"$max": "$balance"}
+            }}
+        ]), None)
+        balances = list(hot.values())
+        count, total = len(hot), sum(balances, Decimal(0))
+        if row and row["count"]:
+            count += row["count"]
+            total += money_from_bson(row["total"])
+            balances += [money_from_bson(row["min"]), money_from_bson(row["max"])]
+        return {
+            "count": count,
+            "total_balance": float(total),
+            "min_balance": float(min(balances)) if balances else 0.0,
+            "max_balance": float(max(balances)) if balances else 0.0,
+            "mean_balance": float(to_money(total / count)) if count else 0.0
+        }
+    
+    def top_accounts(self, n: int = 10):
+        """The ``n`` largest balances, highest first, via ``$sort`` + ``$limit`` on the balance index."""
+        n = max(1, min(n, MAX_TOP_ACCOUNTS))
+        hot = self._hot_balances()
+        accounts = [
+            (account["username"], money_from_bson(account["balance"]))
+            for account in self.accounts.aggregate([
+                self._not_hot(hot),
+                {"$sort": {"balance": -1}},
+                {"$limit": n},
+                {"$project": {"_id": 0, "username": 1, "balance": 1}}
+            ])
+        ]
+        accounts = sorted(accounts + list(hot.items()), key=lambda account: account[1], reverse=True)[:n]
+        return [{"username": username, "balance": float(balance)} for username, balance in accounts]
+    
+    def balance_histogram(self, buckets: int = 10, boundaries=None):
+        """Account counts per balance range, via ``$bucket``.
+
+        Ranges are ``[boundaries[i], boundaries[i + 1])``. Without explicit
+        boundaries, ``buckets`` equal-width ranges span the current min to max
+        balance. Returns the ranges and the count of balances outside them.
+        """
+        if boundaries:
+            boundaries = sorted({to_money(boundary) for boundary in boundaries})
+            if len(boundaries) < 2:
+                raise ValueError("boundaries needs at least two distinct values")
+        else:
+            stats = self.account_stats()
+            if not stats["count"]:
+                return {"buckets": [], "other": 0}
+            buckets = max(1, min(buckets, MAX_HISTOGRAM_BUCKETS))
+            low, high = to_money(stats["min_balance"]), to_money(stats["max_balance"])
+            # Upper bounds are exclusive, so the last range must end past the max
+            width = ((high - low + MONEY_QUANTUM) / buckets).quantize(MONEY_QUANTUM, rounding=ROUND_CEILING)
+            boundaries = [low + width * i for i in range(buckets + 1)]
+        if len(boundaries) - 1 > MAX_HISTOGRAM_BUCKETS:
+            raise ValueError(f"At most {MAX_HISTOGRAM_BUCKETS} buckets are supported")
+
+        hot = self._hot_balances()
+        counts = {}
+        for row in self.accounts.aggregate([
+            self._not_hot(hot),
+            {"$bucket": {
+                "groupBy": "$balance",
+                "boundaries": [self.money_to_bson(boundary) for boundary in boundaries],
+                "default": "other",
+                "output": {"count": {"$sum": 1}}
+            }}
+        ]):
+            key = "other" if row["_id"] == "other" else money_from_bson(row["_id"])
+            counts[key] = row["count"]
+        for balance in hot.values():
+            i = bisect.bisect_right(boundaries, balance) - 1
+            key = boundaries[i] if 0 <= i < len(boundaries) - 1 else "other"
+            counts[key] = counts.get(key, 0) + 1
+        return {
+            "buckets": [
+                {"min": float(low), "max": float(high), "count": counts.get(low, 0)}
+                for low, high in zip(boundaries, boundaries[1:])
+            ],
+            "other": counts.get("other", 0)
+        }
+    
+    def deposit(self, username: str, amount: float, session=None):
+        """Atomically add ``amount`` and return the updated account, or None if missing."""
+        def deposit(session):
+            if username in self.hot_accounts:
+                account = self._hot_account(username, session) if self._credit_hot(username, amount, session) else None
+                if account:
+                    self._record([self._entry(username, "deposit", amount, account["balance"])], session)
+                return account
+            account = self.accounts.find_one_and_update(
+                {"username": username},
+                {"$inc": {"balance": self.money_to_bson(amount)}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if account:
+                account = _public(account)
+                self._record([self._entry(username, "deposit", amount, account["balance"])], session)
+            return account
+
+        try:
+            return self._in_transaction(deposit, session)
+        finally:
+            self._invalidate(username, session=session)
+    
+    def withdraw(self, username: str, amount: float, session=None):
+        """Atomically subtract ``amount`` if the balance covers it.
+
+        Returns ``(account, error)``: the updated account on success, otherwise
+        None and the reason. The extra lookup only happens on the failure path.
+        """
+        def withdraw(session):
+            if username in self.hot_accounts:
+                error = self._debit_hot(username, amount, session)
+                if error:
+                    return None, error
+                account = self._hot_account(username, session)
+                self._record([self._entry(username, "withdrawal", amount, account["balance"])], session)
+                return account, ""
+            account = self.accounts.find_one_and_update(
+                {"username": username, "balance": {"$gte": self.money_to_bson(amount)}},
+                {"$inc": {"balance": self.money_to_bson(-amount)}},
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if account:
+                account = _public(account)
+                self._record([self._entry(username, "withdrawal", amount, account["balance"])], session)
+                return account, ""
+            if self.accounts.find_one({"username": username}, {"_id": 1}, session=session):
+                return None, "Insufficient funds"
+            return None, "Account not found"
+
+        try:
+            return self._in_transaction(withdraw, session)
+        finally:
+            self._invalidate(username, session=session)
+    
+    def _ensure_shards(self, usernames, session=None):
+        """Create any missing zero-balance shard documents for hot accounts."""
+        updates = [
+            UpdateOne(
+                {"username": username, "shard": shard},
+                {"$setOnInsert": {"balance": self.money_to_bson(0)}},
+                upsert=True
+            )
+            for username in usernames for shard in range(self.hot_account_shards)
+        ]
+        if updates:
+            self.account_shards.bulk_write(updates, ordered=False, session=session)
+    
+    def _with_shard_balances(self, accounts, session=None):
+        """Add shard balances into the ``balance`` of any hot accounts in ``accounts``."""
+        hot = [account["username"] for account in accounts if account["username"] in self.hot_accounts]
+        if not hot:
+            return accounts
+        totals = {}
+        for shard in self.account_shards.find(
+            {"username": {"$in": hot}}, {"_id": 0, "username": 1, "balance": 1}, session=session
+        ):
+            totals[shard["username"]] = totals.get(shard["username"], 0) + money_from_bson(shard["balance"])
+        for account in accounts:
+            if account["username"] in totals:
+                account["balance"] = money_from_bson(account["balance"]) + totals[account["username"]]
+        return accounts
+    
+    def _hot_account(self, username: str, session=None):
+        account = self.accounts.find_one({"username": username}, {"_id": 0}, session=session)
+        return _public(self._with_shard_balances([account], session)[0]) if account else None
+    
+    def _credit_hot(self, username: str, amount: float, session=None) -> bool:
+        """Add ``amount`` to a random shard of a hot account; False if the account is missing."""
+        if not self.accounts.find_one({"username": username}, {"_id": 1}, session=session):
+            return False
+        self.account_shards.update_one(
+            {"username": username, "shard": random.randrange(self.hot_account_shards)},
+            {"$inc": {"balance": self.money_to_bson(amount)}},
+            upsert=True,
+            session=session
         )
-        return result.modified_count > 0
+        return True
+    
+    def _debit_hot(self, username: str, amount: float, session=None) -> str:
+        """Take ``amount`` from a hot account's shards and document.
+
+        Tries one guarded debit on a random shard first. If that shard cannot
+        cover the amount, it borrows from the fullest pieces, largest first.
+        Returns "" on success, otherwise "Insufficient funds" or "Account not found".
+        """
+        amount = to_money(amount)
+        if self.account_shards.update_one(
+            {
+                "username": username,
+                "shard": random.randrange(self.hot_account_shards),
+                "balance": {"$gte": self.money_to_bson(amount)}
+            },
+            {"$inc": {"balance": self.money_to_bson(-amount)}},
+            session=session
+        ).modified_count:
+            return ""
+
+        for _ in range(3):
+            account = self.accounts.find_one({"username": username}, {"balance": 1}, session=session)
+            if not account:
+                return "Account not found"
+            pieces = [(self.accounts, {"_id": account["_id"]}, money_from_bson(account["balance"]))]
+            pieces += [
+                (self.account_shards, {"_id": shard["_id"]}, money_from_bson(shard["balance"]))
+                for shard in self.account_shards.find({"username": username}, {"balance": 1}, session=session)
+            ]
+            if sum(balance for _, _, balance in pieces) < amount:
+                return "Insufficient funds"
+            taken, remaining = [], amount
+            for collection, query, balance in sorted(pieces, key=lambda piece: piece[2], reverse=True):
+                take = min(balance, remaining)
+                if take <= 0:
+                    break
+                if not collection.update_one(
+                    {**query, "balance": {"$gte": self.money_to_bson(take)}},
+                    {"$inc": {"balance": self.money_to_bson(-take)}},
+                    session=session
+                ).modified_count:
+                    break
+                taken.append((collection, query, take))
+                remaining -= take
+            if remaining == 0:
+                return ""
+            # A concurrent debit got there first: put back what was taken and
+            # retry with fresh balances
+            for collection, query, take in taken:
+                collection.update_one(query, {"$inc": {"balance": self.money_to_bson(take)}}, session=session)
+        raise RuntimeError(f"Could not debit hot account {username}: balances kept changing")
     
-    def transfer_funds(self, from_user: str, to_user: str, amount: float):
-        from_account = self.accounts.find_one({"username": from_user})
-        to_account = self.accounts.find_one({"username": to_user})
+    def fold_account_shards(self, username: str):
+        """Move a hot account's shard balances back into its accounts document.
 
-        if not from_account:
-            return False, f"Account {from_user} not found"
-        if not to_account:
-            return False, f"Account {to_user} not found"
-        if from_account["balance"] < amount:
-            return False, "Insufficient funds"
+        Run this after removing the account from HOT_ACCOUNTS and restarting
+        the workers, so no new deposits land in its shards; until then the
+        balance still held in its shards is not counted. A deposit from a
+        worker that has not restarted yet is not lost either way. Needs
+        transactions: a crash between the shard delete and the account
+        credit would otherwise lose that shard's balance.
+        """
+        if not self.use_transactions:
+            raise RuntimeError("Folding hot account shards requires MONGO_TRANSACTIONS=true")
 
-        new_from_balance = from_account["balance"] - amount
-        new_to_balance = to_account["balance"] + amount
+        def fold(session):
+            # Delete shards one at a time so a racing deposit is never lost: it
+            # either lands before the delete and is moved, or recreates the shard
+            total = Decimal(0)
+            while True:
+                shard = self.account_shards.find_one_and_delete({"username": username}, session=session)
+                if not shard:
+                    return float(total)
+                balance = money_from_bson(shard["balance"])
+                self.accounts.update_one(
+                    {"username": username}, {"$inc": {"balance": self.money_to_bson(balance)}}, session=session
+                )
+                total += balance
 
-        self.accounts.update_one(
-            {"username": from_user},
-            {"$set": {"balance": new_from_balance}}
+        try:
+            return self._run_transaction(fold)
+        finally:
+            self._invalidate(username)
+    
+    def _entry(self, username: str, kind: str, amount: float, balance: float, counterparty: str = None):
+        entry = {
+            "username": username,
+            "type": kind,
+            "amount": self.money_to_bson(amount),
+            "balance": self.money_to_bson(balance),
+            "timestamp": datetime.now(timezone.utc)
+        }
+        if counterparty is not None:
+            entry["counterparty"] = counterparty
+        return entry
+    
+    def _record(self, entries, session=None):
+        """Append ledger entries; pass the session of the balance change they describe."""
+        if entries:
+            self.transactions.insert_many(entries, ordered=False, session=session)
+    
+    def get_transactions(self, username: str, since: datetime = None,
+                         limit: int = DEFAULT_PAGE_SIZE, cursor: str = ""):
+        """Return one page of ledger entries for ``username``, oldest first, and the next cursor.
+
+        Each page is a range scan on the ``(username, timestamp, _id)`` index
+        that starts after the previous page's last entry. ``since`` applies to
+        the first page only, since a cursor already encodes the position.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = {"username": username}
+        if cursor:
+            try:
+                timestamp, last_id = decode_cursor(cursor).split("|")
+                timestamp, last_id = datetime.fromisoformat(timestamp), ObjectId(last_id)
+            except (ValueError, InvalidId):
+                raise ValueError("Invalid cursor")
+            query["$or"] = [
+                {"timestamp": {"$gt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$gt": last_id}}
+            ]
+        elif since:
+            query["timestamp"] = {"$gte": since}
+        entries = list(
+            self.transactions.find(query, {"username": 0})
+            .sort([("timestamp", 1), ("_id", 1)])
+            .limit(limit + 1)
         )
-        self.accounts.update_one(
-            {"username": to_user},
-            {"$set": {"balance": new_to_balance}}
+        next_cursor = ""
+        if len(entries) > limit:
+            entries = entries[:limit]
+            last = entries[-1]
+            next_cursor = encode_cursor(f"{last['timestamp'].isoformat()}|{last['_id']}")
+        for entry in entries:
+            del entry["_id"]
+            entry["timestamp"] = entry["timestamp"].replace(tzinfo=timezone.utc).isoformat()
+        return [_public(entry) for entry in entries], next_cursor
+    
+    def _run_transaction(self, callback):
+        """Run ``callback(session)`` in a transaction, retrying transient errors.
+
+        ``with_transaction`` retries the whole callback on TransientTransactionError
+        and the commit on UnknownTransactionCommitResult. With transactions
+        disabled the callback runs once with ``session=None``.
+        """
+        if not self.use_transactions:
+            return callback(None)
+        with self.client.start_session() as session:
+            if not self.account_cache:
+                return session.with_transaction(callback)
+            # Accounts written through this session are invalidated once the
+            # transaction has committed (or aborted), never while it is open
+            self._pending_invalidations[session] = set()
+            try:
+                return session.with_transaction(callback)
+            finally:
+                self._invalidate(*self._pending_invalidations.pop(session))
+    
+    def _in_transaction(self, callback, session=None):
+        # Join the caller's transaction if there is one, otherwise start our own
+        if session is not None:
+            return callback(session)
+        return self._run_transaction(callback)
+    
+    def run_idempotent(self, key: str, operation):
+        """Run ``operation(session)`` at most once per ``key`` and return its result.
+
+        The key is claimed and the result recorded in the same transaction as
+        the operation, so a retried call costs one ``_id`` lookup and returns
+        the stored result instead of moving money again. Raises
+        ``OperationInProgress`` while another attempt holds the key, and
+        ``OperationOutcomeUnknown`` when an attempt without transactions failed
+        after claiming it, since it may already have moved money.
+        """
+        record = self.idempotency_keys.find_one({"_id": key})
+        if record and "result" in record:
+            return record["result"]
+
+        def apply(session):
+            # Claim the key first so a concurrent duplicate fails before any write
+            try:
+                self.idempotency_keys.insert_one(
+                    {"_id": key, "created_at": datetime.now(timezone.utc)},
+                    session=session
+                )
+            except DuplicateKeyError:
+                raise _KeyClaimed()
+            try:
+                result = operation(session)
+            except Exception as e:
+                if session is None:
+                    # Some of the operation's writes may have landed, so keep
+                    # the claim: running it again could move the money twice
+                    self.idempotency_keys.update_one(
+                        {"_id": key},
+                        {"$set": {"failed": str(e)}}
+                    )
+                    raise OperationOutcomeUnknown(
+                        f"Operation with idempotency key {key} failed part-way: {e}"
+                    ) from e
+                raise
+            self.idempotency_keys.update_one(
+                {"_id": key},
+                {"$set": {"result": result}},
+                session=session
+            )
+            return result
+
+        try:
+            return self._run_transaction(apply)
+        except _KeyClaimed:
+            record = self.idempotency_keys.find_one({"_id": key}) or {}
+        if "result" in record:
+            return record["result"]
+        if "failed" in record:
+            raise OperationOutcomeUnknown(
+                f"Operation with idempotency key {key} failed part-way: {record['failed']}"
+            )
+        claimed_at = record.get("created_at")
+        if not self.use_transactions and claimed_at is not None:
+            if claimed_at.tzinfo is None:
+                claimed_at = claimed_at.replace(tzinfo=timezone.utc)
+            age = (datetime.now(timezone.utc) - claimed_at).total_seconds()
+            if age > self.idempotency_claim_timeout:
+                # The attempt that claimed it died without recording anything
+                raise OperationOutcomeUnknown(
+                    f"Operation with idempotency key {key} was abandoned part-way"
+                )
+        raise OperationInProgress(f"Operation with idempotency key {key} is still in progress")
+    
+    def transfer_funds(self, from_user: str, to_user: str, amount: float, session=None):
+        """Move ``amount`` between accounts with a guarded debit and a credit.
+
+        Returns ``(success, message, from_account, to_account)`` where the
+        accounts are the post-transfer documents on success. Pass ``session``
+        to join a transaction the caller already started.
+        """
+        def transfer(session):
+            if from_user in self.hot_accounts:
+                error = self._debit_hot(from_user, amount, session)
+                if error == "Account not found":
+                    raise TransactionAborted(f"Account {from_user} not found")
+                if error:
+                    raise TransactionAborted(error)
+                from_account = self._hot_account(from_user, session)
+            else:
+                from_account = self.accounts.find_one_and_update(
+                    {"username": from_user, "balance": {"$gte": self.money_to_bson(amount)}},
+                    {"$inc": {"balance": self.money_to_bson(-amount)}},
+                    projection={"_id": 0},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                if not from_account:
+                    if self.accounts.find_one({"username": from_user}, {"_id": 1}, session=session):
+                        raise TransactionAborted("Insufficient funds")
+                    raise TransactionAborted(f"Account {from_user} not found")
+                from_account = _public(from_account)
+
+            if to_user in self.hot_accounts:
+                to_account = self._hot_account(to_user, session) if self._credit_hot(to_user, amount, session) else None
+            else:
+                to_account = self.accounts.find_one_and_update(
+                    {"username": to_user},
+                    {"$inc": {"balance": self.money_to_bson(amount)}},
+                    projection={"_id": 0},
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+            if not to_account:
+                # Refund the debit: without a transaction nothing rolls it back,
+                # and a caller's enclosing transaction will still commit. A hot
+                # account's balance includes its accounts document, so the
+                # refund can always go there.
+                self.accounts.update_one(
+                    {"username": from_user},
+                    {"$inc": {"balance": self.money_to_bson(amount)}},
+                    session=session
+                )
+                raise TransactionAborted(f"Account {to_user} not found")
+            to_account = _public(to_account)
+            self._record([
+                self._entry(from_user, "transfer_out", amount, from_account["balance"], to_user),
+                self._entry(to_user, "transfer_in", amount, to_account["balance"], from_user)
+            ], session)
+            return from_account, to_account
+
+        try:
+            from_account, to_account = self._in_transaction(transfer, session)
+        except TransactionAborted as e:
+            return False, str(e), None, None
+        finally:
+            self._invalidate(from_user, to_user, session=session)
+        return True, "Transfer successful", from_account, to_account
+    
+    def _account_balances(self, usernames, session=None):
+        cursor = self.accounts.find(
+            {"username": {"$in": list(usernames)}},
+            {"_id": 0, "username": 1, "balance": 1},
+            session=session
         )
-        return True, "Transfer successful"
+        return {
+            account["username"]: money_from_bson(account["balance"])
+            for account in self._with_shard_balances(list(cursor), session)
+        }
+    
+    def apply_account_operations(self, username: str, operations, session=None):
+        """Apply queued deposits and withdrawals on one account, in order, with one write.
 
+        ``operations`` are ``{"type": "deposit" | "withdraw", "amount",
+        "idempotency_key"}`` dicts. Each is checked against the running balance
+        and the net change is written with a single ``$inc``. Keyed operations
+        share the "deposit:<key>" / "withdraw:<key>" records of the single
+        operation activities, so a key that already ran returns its stored
+        result. Returns ``{"balance", "results"}``, or None if the account is missing.
+        """
+        def apply(session):
+            balances = self._account_balances([username], session)
+            if username not in balances:
+                return None
+            balance, delta = balances[username], Decimal(0)
+            results, entries, records = [], [], []
+            record_ids = [
+                operation.get("idempotency_key") and f"{operation['type']}:{operation['idempotency_key']}"
+                for operation in operations
+            ]
+            # One query for every keyed operation's stored result
+            stored = {
+                record["_id"]: record["result"]
+                for record in self.idempotency_keys.find(
+                    {"_id": {"$in": [record_id for record_id in record_ids if record_id]}, "result": {"$exists": True}},
+                    {"result": 1},
+                    session=session
+                )
+            } if any(record_ids) else {}
+            for operation, record_id in zip(operations, record_ids):
+                if record_id in stored:
+                    results.append(stored[record_id])
+                    continue
+                error = amount_error(operation["amount"])
+                amount = to_money(operation["amount"]) if not error else None
+                if error:
+                    result = {"success": False, "error": error}
+                elif operation["type"] == "withdraw" and balance < amount:
+                    result = {"success": False, "error": "Insufficient funds"}
+                elif operation["type"] == "withdraw":
+                    balance, delta = balance - amount, delta - amount
+                    entries.append(self._entry(username, "withdrawal", amount, balance))
+                    result = {"success": True, "message": f"Withdrew ${amount} from {username}", "from_balance": float(balance)}
+                else:
+                    balance, delta = balance + amount, delta + amount
+                    entries.append(self._entry(username, "deposit", amount, balance))
+                    result = {"success": True, "message": f"Deposited ${amount} to {username}", "from_balance": float(balance)}
+                if record_id:
+                    records.append({"_id": record_id, "created_at": datetime.now(timezone.utc), "result": result})
+                results.append(result)
 
-# Global database instance - lazy loaded
+            if username in self.hot_accounts:
+                if delta > 0:
+                    self._credit_hot(username, delta, session)
+                elif delta < 0 and self._debit_hot(username, -delta, session):
+                    raise RuntimeError("Balance changed during account operations")
+            elif delta:
+                result = self.accounts.update_one(
+                    {"username": username, "balance": {"$gte": self.money_to_bson(-delta)}} if delta < 0 else {"username": username},
+                    {"$inc": {"balance": self.money_to_bson(delta)}},
+                    session=session
+                )
+                if not result.matched_count:
+                    # Another writer got in between the read and the write;
+                    # abort so the activity retries with fresh balances
+                    raise RuntimeError("Balance changed during account operations")
+            self._record(entries, session)
+            if records:
+                self.idempotency_keys.insert_many(records, session=session)
+            return {"balance": float(balance), "results": results}
+
+        try:
+            return self._in_transaction(apply, session)
+        finally:
+            self._invalidate(username, session=session)
+    
+    def batch_deposit(self, deposits, session=None):
+        """Apply ``(username, amount)`` deposits with one read and one bulk_write.
+
+        Deposits to the same account are folded into a single ``$inc``.
+        Returns one result dict per deposit, in order. Pass ``session`` to
+        join a transaction the caller already started.
+        """
+        def apply(session):
+            balances = self._account_balances({username for username, _ in deposits}, session)
+            results, deltas, entries = [], {}, []
+            for username, amount in deposits:
+                if username not in balances:
+                    results.append({"success": False, "error": "Account not found"})
+                    continue
+                amount = to_money(amount)
+                balances[username] += amount
+                deltas[username] = deltas.get(username, 0) + amount
+                entries.append(self._entry(username, "deposit", amount, balances[username]))
+                results.append({"success": True, "username": username, "balance": float(balances[username])})
+            if deltas:
+                self.accounts.bulk_write(
+                    [UpdateOne({"username": u}, {"$inc": {"balance": self.money_to_bson(d)}}) for u, d in deltas.items()],
+                    ordered=False,
+                    session=session
+                )
+                self._record(entries, session)
+            return results
+
+        try:
+            return self._in_transaction(apply, session)
+        finally:
+            self._invalidate(*{username for username, _ in deposits}, session=session)
+    
+    def batch_transfer(self, transfers, session=None):
+        """Apply ``(from_user, to_user, amount)`` transfers in order as one transaction.
+
+        Balances are read once and each transfer is checked against the running
+        balances. The net change per account is then written with one guarded
+        bulk_write. Returns one result dict per transfer. Without transactions,
+        each transfer falls back to transfer_funds. Pass ``session`` to join a
+        transaction the caller already started.
+        """
+        if not self.use_transactions:
+            results = []
+            for from_user, to_user, amount in transfers:
+                success, message, from_account, to_account = self.transfer_funds(from_user, to_user, amount)
+                if success:
+                    results.append({
+                        "success": True,
+                        "from_balance": from_account["balance"],
+                        "to_balance": to_account["balance"]
+                    })
+                else:
+                    results.append({"success": False, "error": message})
+            return results
+
+        def apply(session):
+            usernames = {u for from_user, to_user, _ in transfers for u in (from_user, to_user)}
+            balances = self._account_balances(usernames, session)
+            results, deltas, entries = [], {}, []
+            for from_user, to_user, amount in transfers:
+                amount = to_money(amount)
+                if from_user not in balances:
+                    results.append({"success": False, "error": f"Account {from_user} not found"})
+                elif to_user not in balances:
+                    results.append({"success": False, "error": f"Account {to_user} not found"})
+                elif balances[from_user] < amount:
+                    results.append({"success": False, "error": "Insufficient funds"})
+                else:
+                    balances[from_user] -= amount
+                    balances[to_user] += amount
+                    deltas[from_user] = deltas.get(from_user, 0) - amount
+                    deltas[to_user] = deltas.get(to_user, 0) + amount
+                    entries.append(self._entry(from_user, "transfer_out", amount, balances[from_user], to_user))
+                    entries.append(self._entry(to_user, "transfer_in", amount, balances[to_user], from_user))
+                    results.append({
+                        "success": True,
+                        "from_balance": float(balances[from_user]),
+                        "to_balance": float(balances[to_user])
+                    })
+            # A hot account's funds may sit in any of its shards, so its net
+            # debit borrows across them instead of guarding one document
+            for u, d in deltas.items():
+                if d < 0 and u in self.hot_accounts and self._debit_hot(u, -d, session):
+                    raise RuntimeError("Balances changed during batch transfer")
+            updates = [
+                UpdateOne(
+                    {"username": u, "balance": {"$gte": self.money_to_bson(-d)}} if d < 0 else {"username": u},
+                    {"$inc": {"balance": self.money_to_bson(d)}}
+                )
+                for u, d in deltas.items() if d > 0 or (d < 0 and u not in self.hot_accounts)
+            ]
+            if updates:
+                result = self.accounts.bulk_write(updates, ordered=False, session=session)
+                if result.matched_count != len(updates):
+                    # Only reachable if the snapshot read raced a write; abort so
+                    # the activity retries the whole batch
+                    raise RuntimeError("Balances changed during batch transfer")
+            self._record(entries, session)
+            return results
+
+        try:
+            return self._in_transaction(apply, session)
+        finally:
+            self._invalidate(*{u for from_user, to_user, _ in transfers for u in (from_user, to_user)}, session=session)
+
+
+# Global database instance - created on first use, never at import
 _db_instance = None
+_db_lock = threading.Lock()
 
 def get_db():
     global _db_instance
     if _db_instance is None:
-        _db_instance = Database()
-    return _db_instance
-
-# For backward compatibility
-db = get_db()
\ No newline at end of file
+        # Activities call this from many threads at once; only one may build
+        # the client and its connection pool
+        with _db_lock:
+            if _db_instance is None:
+                _db_instance = Database()
+    return _db_instance
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Worker interceptors.
+
+MetricsInterceptor records workflow and activity durations through the
+Temporal SDK metric meter, so the histograms are exported alongside the SDK's
+own metrics (see telemetry.py) with its activity_type/workflow_type labels,
+and workflow metrics are skipped during replay. LocalActivityInterceptor runs
+chosen workflows' activities as local activities.
+"""
+import time
+from datetime import timedelta
+from typing import Any, Iterable, Optional, Type
+from temporalio import activity, workflow
+from temporalio.worker import (
+    ActivityInboundInterceptor,
+    ExecuteActivityInput,
+    ExecuteWorkflowInput,
+    Interceptor,
+    StartActivityInput,
+    StartLocalActivityInput,
+    WorkflowInboundInterceptor,
+    WorkflowInterceptorClassInput,
+    WorkflowOutboundInterceptor
+)
+
+
+class MetricsInterceptor(Interceptor):
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ActivityMetricsInbound(next)
+
+    def workflow_interceptor_class(
+        self, input: WorkflowInterceptorClassInput
+    ) -> Optional[Type[WorkflowInboundInterceptor]]:
+        return _WorkflowMetricsInbound
+
+
+class _ActivityMetricsInbound(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        start = time.monotonic()
+        outcome = "failed"
+        try:
+            result = await self.next.execute_activity(input)
+            # Activities report business failures as {"success": False, ...}
+            outcome = "error" if isinstance(result, dict) and result.get("success") is False else "completed"
+            return result
+        finally:
+            activity.metric_meter().create_histogram_timedelta(
+                "banking_activity_duration", "Activity execution time", "ms"
+            ).record(
+                timedelta(seconds=time.monotonic() - start),
+                {"outcome": outcome}
+            )
+
+
+class _WorkflowMetricsInbound(WorkflowInboundInterceptor):
+    async def execute_workflow(self, input: ExecuteWorkflowInput) -> Any:
+        # Workflow time, not wall time: it is deterministic and includes the
+        # time spent waiting on activities, which is what the workflow costs
+        start = workflow.now()
+        outcome = "failed"
+        try:
+            result = await self.next.execute_workflow(input)
+            outcome = "error" if getattr(result, "success", True) is False else "completed"
+            return result
+        finally:
+            workflow.metric_meter().create_histogram_timedelta(
+                "banking_workflow_duration", "Workflow execution time", "ms"
+            ).record(
+                workflow.now() - start,
+                {"outcome": outcome}
+            )
+
+
+class LocalActivityInterceptor(Interceptor):
+    """Runs the activities of the given workflow types as local activities.
+
+    A local activity runs on the worker that runs the workflow, straight after
+    the workflow task: there is no activity task to dispatch and poll, and
+    history records one marker instead of scheduled/started/completed events.
+    Timeouts and retry policy are kept. Every worker running these workflows
+    must use the same set, or replays will not match their histories.
+    """
+
+    def __init__(self, workflow_types: Iterable[str]):
+        self.workflow_types = frozenset(workflow_types)
+
+    def workflow_interceptor_class(
+        self, input: WorkflowInterceptorClassInput
+    ) -> Optional[Type[WorkflowInboundInterceptor]]:
+        workflow_types = self.workflow_types
+
+        class _LocalActivityInbound(WorkflowInboundInterceptor):
+            def init(self, outbound: WorkflowOutboundInterceptor) -> None:
+                super().init(_LocalActivityOutbound(outbound, workflow_types))
+
+        return _LocalActivityInbound
+
+
+class _LocalActivityOutbound(WorkflowOutboundInterceptor):
+    def __init__(self, next: WorkflowOutboundInterceptor, workflow_types: frozenset):
+        super().__init__(next)
+        self._workflow_types = workflow_types
+
+    def start_activity(self, input: StartActivityInput) -> workflow.ActivityHandle:
+        if workflow.info().workflow_type not in self._workflow_types:
+            return self.next.start_activity(input)
+        return self.next.start_local_activity(StartLocalActivityInput(
+            activity=input.activity,
+            args=input.args,
+            activity_id=input.activity_id,
+            schedule_to_close_timeout=input.schedule_to_close_timeout,
+            schedule_to_start_timeout=input.schedule_to_start_timeout,
+            start_to_close_timeout=input.start_to_close_timeout,
+            retry_policy=input.retry_policy,
+            local_retry_threshold=None,
+            cancellation_type=input.cancellation_type,
+            headers=input.headers,
+            summary=input.summary,
+            event_groups=input.event_groups,
+            arg_types=input.arg_types,
+            ret_type=input.ret_type
+        ))
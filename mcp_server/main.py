@@ -1,6 +1,5 @@
 from mcp.server.fastmcp import FastMCP
 from pymongo.errors import DuplicateKeyError
-from .database import db
 from .models import (
     AccountCreate, 
     AccountResponse, 
@@ -9,35 +8,203 @@ from .models import (
     TransferRequest,
     TransactionResponse
 )
+import argparse
 import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
 import uuid
 from datetime import datetime
-from temporalio.client import Client
+from typing import Optional
+from temporalio.client import WithStartWorkflowOperation, WorkflowUpdateFailedError
+from temporalio.common import WorkflowIDConflictPolicy, WorkflowIDReusePolicy
+from temporalio.exceptions import ApplicationError, WorkflowAlreadyStartedError
 from .workflows import (
+    ACCOUNT_CONTINUING_AS_NEW,
+    AccountOperationResult,
     CreateAccountWorkflow,
     DeleteAccountWorkflow,
     GetAccountWorkflow,
     ListAccountsWorkflow,
+    GetTransactionsWorkflow,
+    AccountStatsWorkflow,
+    TopAccountsWorkflow,
+    BalanceHistogramWorkflow,
     DepositWorkflow,
     WithdrawWorkflow,
     TransferWorkflow,
+    AccountWorkflow,
+    BatchDepositWorkflow,
+    BatchTransferWorkflow,
     HealthCheckWorkflow
 )
+from .activities import (
+    get_account_activity,
+    list_accounts_activity,
+    get_transactions_activity,
+    get_account_stats_activity,
+    top_accounts_activity,
+    balance_histogram_activity,
+    health_check_activity
+)
+from . import connection, telemetry
+from .task_queues import task_queue_for
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+@contextlib.asynccontextmanager
+async def lifespan(server):
+    # Connect while the MCP client is still handshaking, so the first tool
+    # call does not pay for it; not awaited, so a Temporal outage does not
+    # hold up the handshake
+    _start_temporal_connect()
+    yield
+
+# HTTP transports (see main()): where to listen, and whether each request
+# stands alone instead of belonging to a session held in this process
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "stdio")
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8000"))
+MCP_STATELESS_HTTP = os.getenv("MCP_STATELESS_HTTP", "false").lower() == "true"
 
 # Create an MCP server
-mcp = FastMCP("Money Transfer Server (Temporal)")
+mcp = FastMCP(
+    "Money Transfer Server (Temporal)",
+    lifespan=lifespan,
+    host=MCP_HOST,
+    port=MCP_PORT,
+    stateless_http=MCP_STATELESS_HTTP
+)
 
-# Global Temporal client
+# Global Temporal client, and the connect attempt that sets it
 temporal_client = None
-TASK_QUEUE = "banking-task-queue"
+_temporal_connect_task = None
 
-async def get_temporal_client():
+# How long a tool call waits for Temporal while it is unreachable
+TEMPORAL_CONNECT_TIMEOUT_SECONDS = float(os.getenv("TEMPORAL_CONNECT_TIMEOUT_SECONDS", "10"))
+
+# "workflow" runs every tool through Temporal. "direct" serves the read-only
+# tools (get_account, list_accounts, get_transactions, the analytics tools and
+# health_check) straight from the data layer and keeps workflows for
+# mutations only.
+READ_MODE = os.getenv("READ_MODE", "workflow")
+
+# "workflow" runs each deposit/withdrawal as its own short-lived workflow.
+# "entity" sends them as Updates to the account's long-running AccountWorkflow,
+# which applies them in order and in batches. Reads still go to MongoDB,
+# which also sees transfers and batch writes the workflow does not.
+ACCOUNT_MODE = os.getenv("ACCOUNT_MODE", "workflow")
+
+# Retries of an entity update rejected while its workflow continues as new
+ACCOUNT_UPDATE_ATTEMPTS = 10
+ACCOUNT_UPDATE_RETRY_INITIAL_SECONDS = 0.05
+ACCOUNT_UPDATE_RETRY_MAX_SECONDS = 1.0
+
+# Upper bound on operations per batch tool call, keeping workflow inputs well
+# under Temporal's payload size limit
+MAX_BATCH_SIZE = 10000
+
+async def _connect_temporal():
     global temporal_client
-    if temporal_client is None:
-        temporal_client = await Client.connect("localhost:7233")
+    temporal_client = await connection.connect_with_backoff()
     return temporal_client
 
-@mcp.tool()
+def _start_temporal_connect():
+    """The in-flight connect attempt, started if there is none.
+
+    Runs without awaiting, so callers on the event loop can't interleave here
+    and concurrent first calls all share one connection.
+    """
+    global _temporal_connect_task
+    if _temporal_connect_task is None or (temporal_client is None and _temporal_connect_task.done()):
+        _temporal_connect_task = asyncio.create_task(_connect_temporal())
+    return _temporal_connect_task
+
+async def get_temporal_client():
+    if temporal_client is not None:
+        return temporal_client
+    # Shielded: a caller that gives up must not cancel the shared attempt,
+    # which keeps retrying with backoff for later calls
+    try:
+        return await asyncio.wait_for(asyncio.shield(_start_temporal_connect()), TEMPORAL_CONNECT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # str() of the timeout is empty, which tools would report as is
+        raise RuntimeError(f"Temporal unreachable after {TEMPORAL_CONNECT_TIMEOUT_SECONDS:g}s") from None
+
+def tool():
+    """``mcp.tool()`` that also times each call and wraps it in a trace span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "exception"
+            try:
+                with telemetry.span(f"mcp.tool/{fn.__name__}"):
+                    result = await fn(*args, **kwargs)
+                outcome = "error" if isinstance(result, dict) and "error" in result else "ok"
+                return result
+            finally:
+                telemetry.record_duration(
+                    "banking_mcp_tool_duration", "MCP tool call latency",
+                    time.perf_counter() - start, {"tool": fn.__name__, "outcome": outcome}
+                )
+        return mcp.tool()(instrumented)
+    return decorator
+
+async def execute_idempotent_workflow(client, run, args, workflow_id, task_queue):
+    """Execute a workflow whose ID is derived from a client idempotency key.
+
+    A run that is still open is joined instead of started twice, and a closed
+    run is not re-executed: its recorded result is returned instead.
+    """
+    try:
+        return await client.execute_workflow(
+            run,
+            args=args,
+            id=workflow_id,
+            task_queue=task_queue,
+            id_reuse_policy=WorkflowIDReusePolicy.REJECT_DUPLICATE,
+            id_conflict_policy=WorkflowIDConflictPolicy.USE_EXISTING
+        )
+    except WorkflowAlreadyStartedError:
+        handle = client.get_workflow_handle(workflow_id, result_type=AccountOperationResult)
+        return await handle.result()
+
+async def execute_account_update(client, update, kind, username, amount, idempotency_key):
+    """Send a deposit or withdrawal to the account's AccountWorkflow, starting it if needed.
+
+    A run that is draining before it continues as new rejects the update;
+    it is then retried with backoff until the next run accepts it.
+    """
+    delay = ACCOUNT_UPDATE_RETRY_INITIAL_SECONDS
+    for attempt in range(ACCOUNT_UPDATE_ATTEMPTS):
+        # An operation can only be used once, so build one per attempt
+        start = WithStartWorkflowOperation(
+            AccountWorkflow.run,
+            args=[username],
+            id=f"account-{username}",
+            id_conflict_policy=WorkflowIDConflictPolicy.USE_EXISTING,
+            task_queue=task_queue_for(AccountWorkflow)
+        )
+        try:
+            return await client.execute_update_with_start_workflow(
+                update,
+                args=[amount, idempotency_key],
+                start_workflow_operation=start,
+                # Temporal deduplicates updates with the same ID within a run
+                id=f"{kind}-{idempotency_key}" if idempotency_key else None
+            )
+        except WorkflowUpdateFailedError as e:
+            draining = isinstance(e.cause, ApplicationError) and e.cause.type == ACCOUNT_CONTINUING_AS_NEW
+            if not draining or attempt + 1 == ACCOUNT_UPDATE_ATTEMPTS:
+                raise
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, ACCOUNT_UPDATE_RETRY_MAX_SECONDS)
+
+@tool()
 async def create_account(username: str, balance: float = 0.0) -> dict:
     try:
         client = await get_temporal_client()
@@ -47,7 +214,7 @@ async def create_account(username: str, balance: float = 0.0) -> dict:
             CreateAccountWorkflow.run,
             args=[username, balance],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(CreateAccountWorkflow)
         )
         
         if result.success:
@@ -57,7 +224,7 @@ async def create_account(username: str, balance: float = 0.0) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
+@tool()
 async def delete_account(username: str) -> dict:
     try:
         client = await get_temporal_client()
@@ -67,7 +234,7 @@ async def delete_account(username: str) -> dict:
             DeleteAccountWorkflow.run,
             args=[username],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(DeleteAccountWorkflow)
         )
         
         if result.success:
@@ -77,8 +244,17 @@ async def delete_account(username: str) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
+@tool()
 async def get_account(username: str) -> dict:
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(get_account_activity, username)
+            if result["success"]:
+                return result
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
     try:
         client = await get_temporal_client()
         workflow_id = f"get-account-{username}-{uuid.uuid4().hex[:8]}"
@@ -87,7 +263,7 @@ async def get_account(username: str) -> dict:
             GetAccountWorkflow.run,
             args=[username],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(GetAccountWorkflow)
         )
         
         if result.success:
@@ -97,36 +273,95 @@ async def get_account(username: str) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
-async def list_accounts() -> list:
+@tool()
+async def list_accounts(limit: int = 100, cursor: str = "") -> dict:
+    """List accounts one page at a time, ordered by username.
+
+    Pass the returned next_cursor back as cursor to fetch the following page;
+    an empty next_cursor means there are no more accounts. limit is capped at 1000.
+    """
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(list_accounts_activity, limit, cursor)
+            if result["success"]:
+                return {"accounts": result["accounts"], "next_cursor": result["next_cursor"]}
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
     try:
         client = await get_temporal_client()
         workflow_id = f"list-accounts-{uuid.uuid4().hex[:8]}"
         
         result = await client.execute_workflow(
             ListAccountsWorkflow.run,
+            args=[limit, cursor],
+            id=workflow_id,
+            task_queue=task_queue_for(ListAccountsWorkflow)
+        )
+        
+        if result.success:
+            return {"accounts": result.data["accounts"], "next_cursor": result.data["next_cursor"]}
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def get_transactions(username: str, since: str = "", limit: int = 100, cursor: str = "") -> dict:
+    """List an account's ledger entries (deposits, withdrawals, transfers), oldest first.
+
+    since is an optional ISO 8601 timestamp for the first page. Pass the
+    returned next_cursor back as cursor to fetch the following page; an empty
+    next_cursor means there are no more entries. limit is capped at 1000.
+    """
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(get_transactions_activity, username, since, limit, cursor)
+            if result["success"]:
+                return {"transactions": result["transactions"], "next_cursor": result["next_cursor"]}
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
+    try:
+        client = await get_temporal_client()
+        workflow_id = f"get-transactions-{username}-{uuid.uuid4().hex[:8]}"
+        
+        result = await client.execute_workflow(
+            GetTransactionsWorkflow.run,
+            args=[username, since, limit, cursor],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(GetTransactionsWorkflow)
         )
         
         if result.success:
-            return result.data["accounts"]
+            return {"transactions": result.data["transactions"], "next_cursor": result.data["next_cursor"]}
         else:
-            return []
+            return {"error": result.error}
     except Exception as e:
-        return []
+        return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
-async def deposit(username: str, amount: float) -> dict:
+@tool()
+async def get_account_stats() -> dict:
+    """Number of accounts and the total, min, max and mean balance, computed in MongoDB."""
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(get_account_stats_activity)
+            if result["success"]:
+                return result
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
     try:
         client = await get_temporal_client()
-        workflow_id = f"deposit-{username}-{uuid.uuid4().hex[:8]}"
+        workflow_id = f"account-stats-{uuid.uuid4().hex[:8]}"
         
         result = await client.execute_workflow(
-            DepositWorkflow.run,
-            args=[username, amount],
+            AccountStatsWorkflow.run,
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(AccountStatsWorkflow)
         )
         
         if result.success:
@@ -136,19 +371,101 @@ async def deposit(username: str, amount: float) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
-async def withdraw(username: str, amount: float) -> dict:
+@tool()
+async def top_accounts(n: int = 10) -> dict:
+    """The n accounts with the largest balances, highest first. n is capped at 100."""
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(top_accounts_activity, n)
+            if result["success"]:
+                return {"accounts": result["accounts"]}
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
     try:
         client = await get_temporal_client()
-        workflow_id = f"withdraw-{username}-{uuid.uuid4().hex[:8]}"
+        workflow_id = f"top-accounts-{uuid.uuid4().hex[:8]}"
         
         result = await client.execute_workflow(
-            WithdrawWorkflow.run,
-            args=[username, amount],
+            TopAccountsWorkflow.run,
+            args=[n],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(TopAccountsWorkflow)
         )
         
+        if result.success:
+            return {"accounts": result.data["accounts"]}
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def balance_histogram(buckets: int = 10, boundaries: Optional[list[float]] = None) -> dict:
+    """Count accounts per balance range, computed in MongoDB.
+
+    By default the range from the lowest to the highest balance is split into
+    buckets equal-width ranges (at most 100). Pass ascending boundaries to
+    choose the ranges instead; each range includes its min and excludes its
+    max, and "other" counts balances outside all ranges.
+    """
+    if READ_MODE == "direct":
+        try:
+            result = await asyncio.to_thread(balance_histogram_activity, buckets, boundaries)
+            if result["success"]:
+                return {"buckets": result["buckets"], "other": result["other"]}
+            else:
+                return {"error": result["error"]}
+        except Exception as e:
+            return {"error": f"Read failed: {str(e)}"}
+    try:
+        client = await get_temporal_client()
+        workflow_id = f"balance-histogram-{uuid.uuid4().hex[:8]}"
+        
+        result = await client.execute_workflow(
+            BalanceHistogramWorkflow.run,
+            args=[buckets, boundaries],
+            id=workflow_id,
+            task_queue=task_queue_for(BalanceHistogramWorkflow)
+        )
+        
+        if result.success:
+            return {"buckets": result.data["buckets"], "other": result.data["other"]}
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def deposit(username: str, amount: float, idempotency_key: str = "") -> dict:
+    """Deposit funds. Calls repeated with the same idempotency_key apply once."""
+    try:
+        client = await get_temporal_client()
+        args = [username, amount, idempotency_key]
+        
+        if ACCOUNT_MODE == "entity":
+            result = await execute_account_update(
+                client, AccountWorkflow.deposit, "deposit", username, amount, idempotency_key
+            )
+            if result["success"]:
+                return result
+            else:
+                return {"error": result["error"]}
+        
+        if idempotency_key:
+            result = await execute_idempotent_workflow(
+                client, DepositWorkflow.run, args, f"deposit-{idempotency_key}",
+                task_queue_for(DepositWorkflow)
+            )
+        else:
+            result = await client.execute_workflow(
+                DepositWorkflow.run,
+                args=args,
+                id=f"deposit-{username}-{uuid.uuid4().hex[:8]}",
+                task_queue=task_queue_for(DepositWorkflow)
+            )
+        
         if result.success:
             return result.data
         else:
@@ -156,17 +473,114 @@ async def withdraw(username: str, amount: float) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
-async def transfer(from_user: str, to_user: str, amount: float) -> dict:
+@tool()
+async def withdraw(username: str, amount: float, idempotency_key: str = "") -> dict:
+    """Withdraw funds. Calls repeated with the same idempotency_key apply once."""
     try:
         client = await get_temporal_client()
-        workflow_id = f"transfer-{from_user}-{to_user}-{uuid.uuid4().hex[:8]}"
+        args = [username, amount, idempotency_key]
+        
+        if ACCOUNT_MODE == "entity":
+            result = await execute_account_update(
+                client, AccountWorkflow.withdraw, "withdraw", username, amount, idempotency_key
+            )
+            if result["success"]:
+                return result
+            else:
+                return {"error": result["error"]}
+        
+        if idempotency_key:
+            result = await execute_idempotent_workflow(
+                client, WithdrawWorkflow.run, args, f"withdraw-{idempotency_key}",
+                task_queue_for(WithdrawWorkflow)
+            )
+        else:
+            result = await client.execute_workflow(
+                WithdrawWorkflow.run,
+                args=args,
+                id=f"withdraw-{username}-{uuid.uuid4().hex[:8]}",
+                task_queue=task_queue_for(WithdrawWorkflow)
+            )
+        
+        if result.success:
+            return result.data
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def transfer(from_user: str, to_user: str, amount: float, idempotency_key: str = "") -> dict:
+    """Transfer funds. Calls repeated with the same idempotency_key apply once."""
+    try:
+        client = await get_temporal_client()
+        args = [from_user, to_user, amount, idempotency_key]
+        
+        if idempotency_key:
+            result = await execute_idempotent_workflow(
+                client, TransferWorkflow.run, args, f"transfer-{idempotency_key}",
+                task_queue_for(TransferWorkflow)
+            )
+        else:
+            result = await client.execute_workflow(
+                TransferWorkflow.run,
+                args=args,
+                id=f"transfer-{from_user}-{to_user}-{uuid.uuid4().hex[:8]}",
+                task_queue=task_queue_for(TransferWorkflow)
+            )
+        
+        if result.success:
+            return result.data
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def batch_deposit(deposits: list[dict]) -> dict:
+    """Deposit into many accounts in one workflow.
+
+    deposits is a list of {"username", "amount"} objects. Returns per-item
+    results in the same order plus succeeded/failed counts.
+    """
+    if len(deposits) > MAX_BATCH_SIZE:
+        return {"error": f"Batch size exceeds {MAX_BATCH_SIZE} operations"}
+    try:
+        client = await get_temporal_client()
+        workflow_id = f"batch-deposit-{uuid.uuid4().hex[:8]}"
+        
+        result = await client.execute_workflow(
+            BatchDepositWorkflow.run,
+            args=[deposits],
+            id=workflow_id,
+            task_queue=task_queue_for(BatchDepositWorkflow)
+        )
+        
+        if result.success:
+            return result.data
+        else:
+            return {"error": result.error}
+    except Exception as e:
+        return {"error": f"Workflow execution failed: {str(e)}"}
+
+@tool()
+async def batch_transfer(transfers: list[dict]) -> dict:
+    """Apply many transfers, in order, in one workflow.
+
+    transfers is a list of {"from_user", "to_user", "amount"} objects. Returns
+    per-item results in the same order plus succeeded/failed counts.
+    """
+    if len(transfers) > MAX_BATCH_SIZE:
+        return {"error": f"Batch size exceeds {MAX_BATCH_SIZE} operations"}
+    try:
+        client = await get_temporal_client()
+        workflow_id = f"batch-transfer-{uuid.uuid4().hex[:8]}"
         
         result = await client.execute_workflow(
-            TransferWorkflow.run,
-            args=[from_user, to_user, amount],
+            BatchTransferWorkflow.run,
+            args=[transfers],
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(BatchTransferWorkflow)
         )
         
         if result.success:
@@ -176,8 +590,13 @@ async def transfer(from_user: str, to_user: str, amount: float) -> dict:
     except Exception as e:
         return {"error": f"Workflow execution failed: {str(e)}"}
 
-@mcp.tool()
+@tool()
 async def health_check() -> dict:
+    if READ_MODE == "direct":
+        try:
+            return await asyncio.to_thread(health_check_activity)
+        except Exception as e:
+            return {"status": "unhealthy", "service": "MCP Money Transfer Server (Temporal)", "error": f"Read failed: {str(e)}"}
     try:
         client = await get_temporal_client()
         workflow_id = f"health-check-{uuid.uuid4().hex[:8]}"
@@ -185,7 +604,7 @@ async def health_check() -> dict:
         result = await client.execute_workflow(
             HealthCheckWorkflow.run,
             id=workflow_id,
-            task_queue=TASK_QUEUE
+            task_queue=task_queue_for(HealthCheckWorkflow)
         )
         
         if result.success:
@@ -195,5 +614,63 @@ async def health_check() -> dict:
     except Exception as e:
         return {"status": "unhealthy", "service": "MCP Money Transfer Server (Temporal)", "error": f"Workflow execution failed: {str(e)}"}
 
+def http_app():
+    """ASGI app for MCP_TRANSPORT (streamable-http or sse); uvicorn builds one per server process."""
+    # uvicorn does not tell a worker its index, so sibling processes each
+    # claim the first free metrics port from METRICS_BIND_ADDRESS upwards
+    telemetry.configure_port_range(None, int(os.getenv("MCP_HTTP_PROCESSES", "1")))
+    app = mcp.sse_app() if MCP_TRANSPORT == "sse" else mcp.streamable_http_app()
+    sessions_lifespan = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan_context(app):
+        # Connect when the process starts, not when the first session does
+        _start_temporal_connect()
+        async with sessions_lifespan(app) as state:
+            yield state
+
+    app.router.lifespan_context = lifespan_context
+    return app
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Server settings from the command line, falling back to environment variables."""
+    parser = argparse.ArgumentParser(description="Banking MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default=MCP_TRANSPORT)
+    parser.add_argument("--host", default=MCP_HOST)
+    parser.add_argument("--port", type=int, default=MCP_PORT)
+    parser.add_argument("--processes", type=int, default=int(os.getenv("MCP_HTTP_PROCESSES", "1")),
+                        help="HTTP server processes sharing the port; needs --stateless")
+    parser.add_argument("--stateless", action=argparse.BooleanOptionalAction, default=MCP_STATELESS_HTTP,
+                        help="serve every streamable HTTP request on its own, without a server-side session")
+    args = parser.parse_args(argv)
+    if args.processes > 1 and (args.transport != "streamable-http" or not args.stateless):
+        # Sessions live in one process's memory, and nothing routes a
+        # session's requests back to it
+        parser.error("--processes > 1 needs --transport streamable-http --stateless")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.transport == "stdio":
+        mcp.run()
+        return
+    import uvicorn
+    # Each server process imports this module afresh and builds its app
+    # (with its own Temporal client and Mongo pool) from these variables
+    os.environ.update(
+        MCP_TRANSPORT=args.transport,
+        MCP_HOST=args.host,
+        MCP_PORT=str(args.port),
+        MCP_STATELESS_HTTP=str(args.stateless).lower(),
+        MCP_HTTP_PROCESSES=str(args.processes)
+    )
+    uvicorn.run(
+        "mcp_server.main:http_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.processes
+    )
+
 if __name__ == "__main__":
-    mcp.run()
+    main()
@@ -0,0 +1,40 @@
+"""Create the MongoDB indexes the banking server needs, then exit.
+
+    python -m mcp_server.migrate
+    python -m mcp_server.migrate --fold-hot-account treasury
+
+Safe to run repeatedly, e.g. as a deploy step before starting workers with
+--no-ensure-indexes. --fold-hot-account moves a hot account's shard balances
+back into its accounts document; run it after removing the account from
+HOT_ACCOUNTS and restarting the workers. Until it runs, the balance still
+held in the account's shards is not counted.
+"""
+import argparse
+import logging
+import sys
+from .database import get_db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banking MCP database migrations")
+    parser.add_argument("--fold-hot-account", action="append", default=[], metavar="USERNAME",
+                        help="fold this account's shard balances back into it (repeatable)")
+    args = parser.parse_args(argv)
+
+    db = get_db()
+    try:
+        db.ensure_indexes()
+        logger.info(f"Indexes ensured on {db.mongo_db}")
+        for username in args.fold_hot_account:
+            logger.info(f"Folded {db.fold_account_shards(username)} from shards into {username}")
+    except Exception as e:
+        logger.error(f"Migration failed on {db.mongo_db}: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
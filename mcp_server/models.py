@@ -1,41 +1,72 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+from pydantic import AfterValidator, BaseModel, Field
+from typing import Annotated, Optional
+
+# Money is exact to the cent end to end: Decimal in Python, Decimal128 in MongoDB
+MONEY_QUANTUM = Decimal("0.01")
+
+
+def to_money(value) -> Decimal:
+    """Exact cents value of an amount. Floats go through str() so 0.1 stays 0.1.
+
+    Raises ValueError for anything that is not a finite number.
+    """
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Amount must be a number, got {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"Amount must be a finite number, got {value!r}")
+    return amount.quantize(MONEY_QUANTUM, rounding=ROUND_HALF_EVEN)
+
+
+def amount_error(value) -> str:
+    """Why ``value`` is not a positive amount of money, or "" if it is."""
+    try:
+        if to_money(value) > 0:
+            return ""
+    except ValueError as e:
+        return str(e)
+    return "Amount must be positive"
+
+
+Money = Annotated[Decimal, AfterValidator(to_money)]
 
 
 class Account(BaseModel):
     username: str = Field(..., description="Unique username for the account")
-    balance: float = Field(..., description="Account balance")
+    balance: Money = Field(..., description="Account balance")
 
 
 class AccountCreate(BaseModel):
     username: str = Field(..., description="Unique username for the account")
-    balance: float = Field(default=0.0, description="Initial account balance")
+    balance: Money = Field(default=0.0, description="Initial account balance")
 
 
 class DepositRequest(BaseModel):
     username: str = Field(..., description="Username of the account to deposit to")
-    amount: float = Field(..., gt=0, description="Amount to deposit (must be positive)")
+    amount: Money = Field(..., gt=0, description="Amount to deposit (must be positive)")
 
 
 class WithdrawRequest(BaseModel):
     username: str = Field(..., description="Username of the account to withdraw from")
-    amount: float = Field(..., gt=0, description="Amount to withdraw (must be positive)")
+    amount: Money = Field(..., gt=0, description="Amount to withdraw (must be positive)")
 
 
 class TransferRequest(BaseModel):
     from_user: str = Field(..., description="Username of the sender")
     to_user: str = Field(..., description="Username of the receiver")
-    amount: float = Field(..., gt=0, description="Amount to transfer (must be positive)")
+    amount: Money = Field(..., gt=0, description="Amount to transfer (must be positive)")
 
 
 class AccountResponse(BaseModel):
     username: str
-    balance: float
+    balance: Money
     message: Optional[str] = None
 
 
 class TransactionResponse(BaseModel):
     success: bool
     message: str
-    from_balance: Optional[float] = None
-    to_balance: Optional[float] = None
\ No newline at end of file
+    from_balance: Optional[Money] = None
+    to_balance: Optional[Money] = None
\ No newline at end of file
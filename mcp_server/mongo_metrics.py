@@ -0,0 +1,160 @@
+import bisect
+import threading
+from pymongo import monitoring
+from . import telemetry
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS_MS = (*telemetry.DURATION_BUCKETS_MS, float("inf"))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram. Not locked; PoolMetrics serializes access."""
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum_ms += ms
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS_MS[-1]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.50),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): n
+                for bound, n in zip(LATENCY_BUCKETS_MS, self.counts)
+            }
+        }
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener, monitoring.CommandListener):
+    """CMAP and command-monitoring listener that aggregates pool and command stats.
+
+    Pass it to ``MongoClient(event_listeners=[...])``. Driver threads call
+    the handlers, so they only update counters under a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.checkout_failures = {}  # reason -> count
+        self.pool_clears = 0
+        self.checkout_wait = LatencyHistogram()
+        self.commands = {}  # command name -> LatencyHistogram
+        self.command_failures = {}  # command name -> count
+
+    # Connection pool (CMAP) events
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+        self._observe_checkout(event.duration, event.reason)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+        self._observe_checkout(event.duration, "ok")
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checkins += 1
+
+    # Command monitoring events
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._observe_command(event.command_name, event.duration_micros, "ok")
+
+    def failed(self, event):
+        self._observe_command(event.command_name, event.duration_micros, "failed")
+        with self._lock:
+            self.command_failures[event.command_name] = self.command_failures.get(event.command_name, 0) + 1
+
+    def _observe_checkout(self, duration, outcome: str):
+        if duration is None:
+            return
+        with self._lock:
+            self.checkout_wait.observe(duration * 1000)
+        telemetry.record_duration(
+            "banking_mongo_checkout_wait", "Time to check a connection out of the pool",
+            duration, {"outcome": outcome}
+        )
+
+    def _observe_command(self, name: str, duration_micros: int, outcome: str):
+        with self._lock:
+            histogram = self.commands.get(name)
+            if histogram is None:
+                histogram = self.commands[name] = LatencyHistogram()
+            histogram.observe(duration_micros / 1000)
+        telemetry.record_duration(
+            "banking_mongo_command_duration", "MongoDB command round trip",
+            duration_micros / 1_000_000, {"command": name, "outcome": outcome}
+        )
+
+    @property
+    def open_connections(self) -> int:
+        return self.connections_created - self.connections_closed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connections_open": self.open_connections,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "checked_out": self.checkouts - self.checkins,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "pool_clears": self.pool_clears,
+                "checkout_wait": self.checkout_wait.snapshot(),
+                "commands": {name: h.snapshot() for name, h in sorted(self.commands.items())},
+                "command_failures": dict(self.command_failures)
+            }
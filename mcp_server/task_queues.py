@@ -0,0 +1,39 @@
+"""Which Temporal task queue each workflow runs on.
+
+Operations are grouped into queue classes that can each be pointed at their
+own task queue (TASK_QUEUE_<CLASS>) and served by their own workers, so slow
+bulk work or large reads never queue ahead of transfers. Activities run on
+their workflow's queue. Unset or empty variables fall back to TASK_QUEUE, so by
+default everything shares one queue.
+"""
+import os
+
+# ``or`` rather than a getenv default: env.example-style empty values count as unset
+TASK_QUEUE = os.getenv("TASK_QUEUE") or "banking-task-queue"
+
+QUEUE_CLASSES = {
+    "accounts": ["CreateAccountWorkflow", "DeleteAccountWorkflow"],
+    "reads": [
+        "GetAccountWorkflow", "ListAccountsWorkflow", "GetTransactionsWorkflow", "HealthCheckWorkflow",
+        "AccountStatsWorkflow", "TopAccountsWorkflow", "BalanceHistogramWorkflow"
+    ],
+    "transfers": ["DepositWorkflow", "WithdrawWorkflow", "TransferWorkflow", "AccountWorkflow"],
+    "bulk": ["BatchDepositWorkflow", "BatchTransferWorkflow"],
+}
+
+TASK_QUEUES = {
+    queue_class: os.getenv(f"TASK_QUEUE_{queue_class.upper()}") or TASK_QUEUE
+    for queue_class in QUEUE_CLASSES
+}
+
+_QUEUE_CLASS_BY_WORKFLOW = {
+    name: queue_class for queue_class, names in QUEUE_CLASSES.items() for name in names
+}
+
+
+def queue_class_for(workflow_class) -> str:
+    return _QUEUE_CLASS_BY_WORKFLOW[workflow_class.__name__]
+
+
+def task_queue_for(workflow_class) -> str:
+    return TASK_QUEUES[queue_class_for(workflow_class)]
@@ -0,0 +1,157 @@
+"""Process-wide metrics and tracing setup.
+
+Metrics go through a Temporal SDK ``Runtime`` whose Prometheus exporter serves
+``/metrics`` on METRICS_BIND_ADDRESS. The same endpoint then carries the SDK's
+own client and worker metrics and the banking_* histograms recorded here, in
+interceptors.py and by the Mongo listener. Tracing is optional: with
+OTEL_EXPORTER_OTLP_ENDPOINT set (and opentelemetry-sdk plus the OTLP exporter
+installed), spans are exported over OTLP and propagated through Temporal, so
+an MCP tool span parents its workflow and activity spans.
+"""
+import contextlib
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Optional
+from temporalio.common import MetricMeter
+from temporalio.runtime import PrometheusConfig, Runtime, TelemetryConfig
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket bounds in milliseconds; the SDK defaults start at 50ms,
+# too coarse for single Mongo commands and direct reads
+DURATION_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+DURATION_HISTOGRAMS = (
+    "banking_mcp_tool_duration",
+    "banking_workflow_duration",
+    "banking_activity_duration",
+    "banking_mongo_command_duration",
+    "banking_mongo_checkout_wait",
+    "banking_temporal_connect_duration",
+    # The SDK's per-RPC client latency, by operation
+    "temporal_request_latency",
+)
+
+_lock = threading.Lock()
+_runtime = None
+_tracing_interceptors = None
+
+
+def configure(metrics_bind_address: Optional[str] = None):
+    """Create the process Runtime, exporting metrics on ``metrics_bind_address``.
+
+    Defaults to METRICS_BIND_ADDRESS; when neither is set metrics are not
+    exported. Only the first call (explicit or via ``runtime()``) has an effect.
+    """
+    global _runtime
+    with _lock:
+        if _runtime is not None:
+            return _runtime
+        address = metrics_bind_address or os.getenv("METRICS_BIND_ADDRESS")
+        if address:
+            try:
+                _runtime = _prometheus_runtime(address)
+            except Exception as e:
+                # e.g. the port is taken by another process reading the same .env;
+                # losing metrics must not take the process down with it
+                logger.error(f"Could not serve Prometheus metrics on {address}, metrics disabled: {str(e)}")
+                _runtime = Runtime.default()
+        else:
+            _runtime = Runtime.default()
+        return _runtime
+
+
+def configure_port_range(metrics_bind_address: Optional[str], count: int):
+    """Like ``configure``, but take the first free port of ``count`` from the address's port.
+
+    For sibling processes that cannot be told their index, such as uvicorn
+    workers: each one ends up serving /metrics on its own port.
+    """
+    global _runtime
+    address = metrics_bind_address or os.getenv("METRICS_BIND_ADDRESS")
+    if not address or count <= 1:
+        return configure(address)
+    host, port = address.rsplit(":", 1)
+    with _lock:
+        if _runtime is not None:
+            return _runtime
+        for index in range(count):
+            try:
+                _runtime = _prometheus_runtime(f"{host}:{int(port) + index}")
+                return _runtime
+            except Exception as e:
+                error = e
+        logger.error(f"Could not serve Prometheus metrics on ports {port}-{int(port) + count - 1} "
+                     f"of {host}, metrics disabled: {str(error)}")
+        _runtime = Runtime.default()
+        return _runtime
+
+
+def _prometheus_runtime(address: str) -> Runtime:
+    runtime = Runtime(telemetry=TelemetryConfig(metrics=PrometheusConfig(
+        bind_address=address,
+        histogram_bucket_overrides={name: DURATION_BUCKETS_MS for name in DURATION_HISTOGRAMS}
+    )))
+    logger.info(f"Serving Prometheus metrics on http://{address}/metrics")
+    return runtime
+
+
+def runtime() -> Runtime:
+    return _runtime or configure()
+
+
+def metric_meter() -> MetricMeter:
+    return runtime().metric_meter
+
+
+def tracing_interceptors() -> list:
+    """Temporal client interceptors that propagate OpenTelemetry traces, if enabled."""
+    global _tracing_interceptors
+    with _lock:
+        if _tracing_interceptors is not None:
+            return _tracing_interceptors
+        _tracing_interceptors = []
+        if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+            return _tracing_interceptors
+        try:
+            from opentelemetry import trace
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from temporalio.contrib.opentelemetry import TracingInterceptor
+        except ImportError as e:
+            logger.warning(f"OTEL_EXPORTER_OTLP_ENDPOINT is set but tracing is unavailable: {str(e)}")
+            return _tracing_interceptors
+        # Endpoint, headers and service name come from the standard OTEL_* variables
+        provider = TracerProvider()
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        trace.set_tracer_provider(provider)
+        _tracing_interceptors = [TracingInterceptor()]
+        return _tracing_interceptors
+
+
+def span(name: str, **attributes):
+    """Context manager for a span, or a no-op when tracing is not enabled."""
+    if not tracing_interceptors():
+        return contextlib.nullcontext()
+    from opentelemetry import trace
+    return trace.get_tracer(__name__).start_as_current_span(name, attributes=attributes)
+
+
+_histograms = {}
+
+
+def record_duration(name: str, description: str, seconds: float, attributes: dict):
+    """Record a duration in the ``name`` histogram of the process metric meter.
+
+    Never raises: metrics are best effort and callers record from tool and
+    connect paths, often in ``finally`` blocks.
+    """
+    try:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = metric_meter().create_histogram_timedelta(name, description, "ms")
+        histogram.record(timedelta(seconds=seconds), attributes)
+    except Exception as e:
+        logger.warning(f"Could not record {name}: {str(e)}")
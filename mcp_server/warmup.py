@@ -0,0 +1,85 @@
+"""Workflow sandbox setup and start-up warm-up for the worker.
+
+The sandbox re-imports a workflow's module for every workflow run unless the
+module is passed through. workflows.py has no side effects or mutable module
+state, so it is passed through and each run only builds its workflow instance;
+the sandbox's runtime restrictions (time, random, I/O...) still apply.
+
+The first workflow task in a process also pays for one-off setup inside the
+SDK and the sandbox. ``prewarm_workflows`` replays a synthetic first task of
+each workflow before the worker polls, so real tasks never pay it.
+"""
+import inspect
+import time
+import typing
+from typing import List, Sequence
+from temporalio.api.enums.v1 import EventType
+from temporalio.api.history.v1 import History
+from temporalio.client import WorkflowHistory
+from temporalio.converter import DataConverter
+from temporalio.worker import Replayer, WorkflowRunner
+from temporalio.worker.workflow_sandbox import SandboxedWorkflowRunner, SandboxRestrictions
+from . import workflows
+
+SANDBOX_PASSTHROUGH_MODULES = (workflows.__name__,)
+
+
+def workflow_runner(passthrough: bool = True) -> WorkflowRunner:
+    restrictions = SandboxRestrictions.default
+    if passthrough:
+        restrictions = restrictions.with_passthrough_modules(*SANDBOX_PASSTHROUGH_MODULES)
+    return SandboxedWorkflowRunner(restrictions=restrictions)
+
+
+def _placeholder(hint):
+    if hint is str:
+        return "warmup"
+    if hint in (int, float):
+        return hint(1)
+    if typing.get_origin(hint) is list:
+        return []
+    return None
+
+
+def warmup_history(workflow_class, workflow_id: str) -> WorkflowHistory:
+    """History of a workflow that has just completed its first workflow task.
+
+    Required run() arguments get placeholder values; replaying it runs the
+    workflow up to its first command without touching any activity.
+    """
+    hints = typing.get_type_hints(workflow_class.run)
+    params = list(inspect.signature(workflow_class.run).parameters.values())[1:]
+    args = [_placeholder(hints.get(p.name)) for p in params if p.default is inspect.Parameter.empty]
+
+    history = History()
+    def add(event_type):
+        event = history.events.add(event_id=len(history.events) + 1, event_type=event_type)
+        event.event_time.GetCurrentTime()
+        return event
+    started = add(EventType.EVENT_TYPE_WORKFLOW_EXECUTION_STARTED).workflow_execution_started_event_attributes
+    started.workflow_type.name = workflow_class.__name__
+    started.task_queue.name = "warmup"
+    started.input.payloads.extend(DataConverter.default.payload_converter.to_payloads(args))
+    started.workflow_task_timeout.FromSeconds(10)
+    started.original_execution_run_id = started.first_execution_run_id = workflow_id
+    started.attempt = 1
+    add(EventType.EVENT_TYPE_WORKFLOW_TASK_SCHEDULED).workflow_task_scheduled_event_attributes.task_queue.name = "warmup"
+    add(EventType.EVENT_TYPE_WORKFLOW_TASK_STARTED).workflow_task_started_event_attributes.scheduled_event_id = 2
+    completed = add(EventType.EVENT_TYPE_WORKFLOW_TASK_COMPLETED).workflow_task_completed_event_attributes
+    completed.scheduled_event_id, completed.started_event_id = 2, 3
+    return WorkflowHistory(workflow_id, list(history.events))
+
+
+async def prewarm_workflows(workflow_classes: Sequence, runner: WorkflowRunner, interceptors: List = ()) -> float:
+    """Replay one synthetic first task per workflow class; returns the seconds taken.
+
+    Raises if any replay fails, which also catches a workflow the sandbox rejects.
+    """
+    async def histories():
+        for i, workflow_class in enumerate(workflow_classes):
+            yield warmup_history(workflow_class, f"warmup-{i}")
+
+    start = time.perf_counter()
+    replayer = Replayer(workflows=list(workflow_classes), workflow_runner=runner, interceptors=interceptors)
+    await replayer.replay_workflows(histories())
+    return time.perf_counter() - start
@@ -1,16 +1,33 @@
+import argparse
 import asyncio
 import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from datetime import timedelta
 from temporalio import workflow
-from temporalio.client import Client
 from temporalio.worker import Worker
+from .database import get_db
+from .interceptors import LocalActivityInterceptor, MetricsInterceptor
+from . import connection, telemetry, warmup
+from .task_queues import QUEUE_CLASSES, TASK_QUEUES
 from .workflows import (
     CreateAccountWorkflow,
     DeleteAccountWorkflow,
     GetAccountWorkflow,
     ListAccountsWorkflow,
+    GetTransactionsWorkflow,
+    AccountStatsWorkflow,
+    TopAccountsWorkflow,
+    BalanceHistogramWorkflow,
     DepositWorkflow,
     WithdrawWorkflow,
     TransferWorkflow,
+    AccountWorkflow,
+    BatchDepositWorkflow,
+    BatchTransferWorkflow,
     HealthCheckWorkflow
 )
 from .activities import (
@@ -18,9 +35,16 @@ from .activities import (
     delete_account_activity,
     get_account_activity,
     list_accounts_activity,
+    get_transactions_activity,
+    get_account_stats_activity,
+    top_accounts_activity,
+    balance_histogram_activity,
     deposit_activity,
     withdraw_activity,
     transfer_activity,
+    apply_account_operations_activity,
+    batch_deposit_activity,
+    batch_transfer_activity,
     health_check_activity
 )
 
@@ -28,43 +52,290 @@ from .activities import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-TASK_QUEUE = "banking-task-queue"
+# Activities are synchronous (pymongo blocks), so they run on a thread pool
+# instead of the worker's event loop. Size it to the number of Mongo calls
+# that should be in flight at once; keep it <= the MongoClient pool size.
+ACTIVITY_THREADS = int(os.getenv("ACTIVITY_THREADS", "100"))
 
-async def main():
+WORKFLOWS = [
+    CreateAccountWorkflow,
+    DeleteAccountWorkflow,
+    GetAccountWorkflow,
+    ListAccountsWorkflow,
+    GetTransactionsWorkflow,
+    AccountStatsWorkflow,
+    TopAccountsWorkflow,
+    BalanceHistogramWorkflow,
+    DepositWorkflow,
+    WithdrawWorkflow,
+    TransferWorkflow,
+    AccountWorkflow,
+    BatchDepositWorkflow,
+    BatchTransferWorkflow,
+    HealthCheckWorkflow
+]
+
+# Workflows that make one short activity call; --local-activities may run
+# their activities as local activities. Batch and entity work stays on
+# normal activities.
+SHORT_WORKFLOWS = [
+    "CreateAccountWorkflow",
+    "DeleteAccountWorkflow",
+    "GetAccountWorkflow",
+    "ListAccountsWorkflow",
+    "GetTransactionsWorkflow",
+    "AccountStatsWorkflow",
+    "TopAccountsWorkflow",
+    "BalanceHistogramWorkflow",
+    "DepositWorkflow",
+    "WithdrawWorkflow",
+    "TransferWorkflow",
+    "HealthCheckWorkflow"
+]
+
+ACTIVITIES = [
+    create_account_activity,
+    delete_account_activity,
+    get_account_activity,
+    list_accounts_activity,
+    get_transactions_activity,
+    get_account_stats_activity,
+    top_accounts_activity,
+    balance_histogram_activity,
+    deposit_activity,
+    withdraw_activity,
+    transfer_activity,
+    apply_account_operations_activity,
+    batch_deposit_activity,
+    batch_transfer_activity,
+    health_check_activity
+]
+
+def _env_int(name: str, default=None):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _queue_limits(value: str) -> dict:
+    """Parse "bulk=4,reads=50" into {"bulk": 4, "reads": 50}."""
+    limits = {}
+    for item in filter(None, value.split(",")):
+        queue_class, _, limit = item.partition("=")
+        if queue_class not in QUEUE_CLASSES:
+            raise argparse.ArgumentTypeError(f"unknown queue class: {queue_class}")
+        limits[queue_class] = int(limit)
+    return limits
+
+def _queue_classes(value: str) -> list:
+    if value == "all":
+        return list(QUEUE_CLASSES)
+    queue_classes = [queue_class for queue_class in value.split(",") if queue_class]
+    for queue_class in queue_classes:
+        if queue_class not in QUEUE_CLASSES:
+            raise argparse.ArgumentTypeError(f"unknown queue class: {queue_class}")
+    return queue_classes
+
+def _local_activity_workflows(value: str) -> list:
+    if value == "short":
+        return list(SHORT_WORKFLOWS)
+    names = [name for name in value.split(",") if name]
+    for name in names:
+        if name not in SHORT_WORKFLOWS:
+            raise argparse.ArgumentTypeError(f"not a short workflow: {name}")
+    return names
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Worker settings from the command line, falling back to environment variables.
+
+    Limits left unset keep the Temporal SDK defaults.
+    """
+    parser = argparse.ArgumentParser(description="Banking MCP Temporal worker")
+    parser.add_argument("--temporal-address", default=connection.TEMPORAL_ADDRESS)
+    parser.add_argument("--namespace", default=connection.TEMPORAL_NAMESPACE)
+    parser.add_argument("--processes", type=int, default=_env_int("WORKER_PROCESSES", 1),
+                        help="worker processes sharing the task queue; 0 starts one per CPU")
+    parser.add_argument("--queues", type=_queue_classes, default=os.getenv("WORKER_QUEUES", "all"),
+                        help=f"comma-separated queue classes to serve ({', '.join(QUEUE_CLASSES)}) or 'all'")
+    parser.add_argument("--activity-threads", type=int, default=ACTIVITY_THREADS,
+                        help="thread pool size for (synchronous) activities, per task queue")
+    parser.add_argument("--queue-activity-threads", type=_queue_limits,
+                        default=os.getenv("WORKER_QUEUE_ACTIVITY_THREADS", ""),
+                        help="per queue class overrides of --activity-threads, e.g. bulk=4,reads=50")
+    parser.add_argument("--max-concurrent-activities", type=int,
+                        default=_env_int("WORKER_MAX_CONCURRENT_ACTIVITIES"),
+                        help="defaults to --activity-threads")
+    parser.add_argument("--max-concurrent-workflow-tasks", type=int,
+                        default=_env_int("WORKER_MAX_CONCURRENT_WORKFLOW_TASKS"))
+    parser.add_argument("--max-concurrent-workflow-task-polls", type=int,
+                        default=_env_int("WORKER_MAX_CONCURRENT_WORKFLOW_TASK_POLLS"))
+    parser.add_argument("--max-concurrent-activity-task-polls", type=int,
+                        default=_env_int("WORKER_MAX_CONCURRENT_ACTIVITY_TASK_POLLS"))
+    parser.add_argument("--max-cached-workflows", type=int,
+                        default=_env_int("WORKER_MAX_CACHED_WORKFLOWS"))
+    parser.add_argument("--local-activities", type=_local_activity_workflows,
+                        default=os.getenv("WORKER_LOCAL_ACTIVITIES", ""),
+                        help="comma-separated workflow types whose activity runs as a local activity, or 'short' for all "
+                             "single-activity workflows; every worker must use the same value")
+    parser.add_argument("--max-concurrent-local-activities", type=int,
+                        default=_env_int("WORKER_MAX_CONCURRENT_LOCAL_ACTIVITIES"))
+    parser.add_argument("--graceful-shutdown-seconds", type=int,
+                        default=_env_int("WORKER_GRACEFUL_SHUTDOWN_SECONDS", 30),
+                        help="how long in-flight activities may finish after a shutdown signal")
+    parser.add_argument("--ensure-indexes", action=argparse.BooleanOptionalAction,
+                        default=os.getenv("ENSURE_INDEXES", "true").lower() == "true",
+                        help="create MongoDB indexes in the background once polling has started")
+    parser.add_argument("--metrics-bind-address", default=os.getenv("METRICS_BIND_ADDRESS"),
+                        help="host:port for the Prometheus /metrics endpoint; worker process N uses port+N")
+    parser.add_argument("--sandbox-passthrough", action=argparse.BooleanOptionalAction,
+                        default=os.getenv("WORKER_SANDBOX_PASSTHROUGH", "true").lower() == "true",
+                        help="pass the workflows module through the sandbox instead of re-importing it per run")
+    parser.add_argument("--prewarm-workflows", action=argparse.BooleanOptionalAction,
+                        default=os.getenv("WORKER_PREWARM_WORKFLOWS", "true").lower() == "true",
+                        help="replay a synthetic first task of each workflow before polling")
+    args = parser.parse_args(argv)
+    # A worker polling a queue must register every workflow that runs on it,
+    # or tasks for the missing types fail on this worker and keep retrying
+    selected_queues = {TASK_QUEUES[queue_class] for queue_class in args.queues}
+    missing = [c for c in QUEUE_CLASSES if c not in args.queues and TASK_QUEUES[c] in selected_queues]
+    if missing:
+        parser.error(f"--queues must also include {', '.join(missing)}, which share a task queue with the "
+                     f"selected classes; give them their own TASK_QUEUE_* to split them")
+    return args
+
+def _tuning_options(args: argparse.Namespace) -> dict:
+    options = {
+        "max_concurrent_activities": args.max_concurrent_activities or args.activity_threads,
+        "max_concurrent_workflow_tasks": args.max_concurrent_workflow_tasks,
+        "max_concurrent_workflow_task_polls": args.max_concurrent_workflow_task_polls,
+        "max_concurrent_activity_task_polls": args.max_concurrent_activity_task_polls,
+        "max_cached_workflows": args.max_cached_workflows,
+        "max_concurrent_local_activities": args.max_concurrent_local_activities,
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+async def ensure_indexes(retry_seconds: float = 5):
+    """Create MongoDB indexes off the event loop, retrying until Mongo is reachable."""
+    while True:
+        try:
+            await asyncio.to_thread(get_db().ensure_indexes)
+            logger.info("MongoDB indexes ensured")
+            return
+        except Exception as e:
+            logger.warning(f"Could not ensure MongoDB indexes, retrying in {retry_seconds}s: {str(e)}")
+            await asyncio.sleep(retry_seconds)
+
+async def run_worker(args: argparse.Namespace):
+    """Run one worker until SIGINT/SIGTERM, then drain it gracefully."""
     # Connect to Temporal server
-    client = await Client.connect("localhost:7233")
+    client = await connection.connect(args.temporal_address, args.namespace)
+    
+    # Open MONGO_MIN_POOL_SIZE connections before the first activity needs one
+    try:
+        connections = await asyncio.to_thread(get_db().prewarm_pool)
+        if connections is not None:
+            logger.info(f"MongoDB pool prewarmed with {connections} connections")
+        # Checked now so a standalone mongod is reported at startup
+        transactions = await asyncio.to_thread(lambda: get_db().use_transactions)
+        logger.info(f"MongoDB transactions {'enabled' if transactions else 'disabled'}")
+    except Exception as e:
+        logger.warning(f"Could not prewarm MongoDB pool: {str(e)}")
+    
+    runner = warmup.workflow_runner(args.sandbox_passthrough)
+    interceptors = [MetricsInterceptor()]
+    if args.local_activities:
+        interceptors.append(LocalActivityInterceptor(args.local_activities))
+        logger.info(f"Local activities for: {', '.join(args.local_activities)}")
+    if args.prewarm_workflows:
+        # Pays the sandbox's one-off setup here instead of on the first real task
+        seconds = await warmup.prewarm_workflows(WORKFLOWS, runner, interceptors)
+        logger.info(f"Workflows prewarmed in {seconds * 1000:.0f} ms")
+    
+    # One worker per distinct task queue; queue classes that share a queue
+    # share its worker, which gets the largest of their thread overrides
+    queue_classes_by_queue = {}
+    for queue_class in args.queues:
+        queue_classes_by_queue.setdefault(TASK_QUEUES[queue_class], []).append(queue_class)
+    tuning = _tuning_options(args)
+    workers, executors = [], []
+    for task_queue, queue_classes in queue_classes_by_queue.items():
+        overrides = [args.queue_activity_threads[c] for c in queue_classes if c in args.queue_activity_threads]
+        threads = max(overrides) if overrides else args.activity_threads
+        names = {name for queue_class in queue_classes for name in QUEUE_CLASSES[queue_class]}
+        activity_executor = ThreadPoolExecutor(max_workers=threads)
+        executors.append(activity_executor)
+        workers.append(Worker(
+            client,
+            task_queue=task_queue,
+            workflows=[w for w in WORKFLOWS if w.__name__ in names],
+            # Activities run on their workflow's queue, so registering all of
+            # them is harmless and keeps the mapping in one place
+            activities=ACTIVITIES,
+            activity_executor=activity_executor,
+            workflow_runner=runner,
+            interceptors=interceptors,
+            graceful_shutdown_timeout=timedelta(seconds=args.graceful_shutdown_seconds),
+            **{**tuning, "max_concurrent_activities": threads if overrides else tuning["max_concurrent_activities"]}
+        ))
+        logger.info(f"Task queue {task_queue}: {', '.join(queue_classes)} ({threads} activity threads)")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    logger.info(f"Banking MCP Temporal Worker starting (pid {os.getpid()})...")
+    logger.info(f"Tuning: {tuning}")
+    
+    # Start workers; leaving the block stops polling and waits for in-flight tasks
+    index_task = None
+    try:
+        async with AsyncExitStack() as stack:
+            for worker in workers:
+                await stack.enter_async_context(worker)
+            if args.ensure_indexes:
+                # Does not hold up polling; a Mongo outage only delays it
+                index_task = asyncio.create_task(ensure_indexes())
+            await stop.wait()
+            logger.info("Shutting down worker...")
+    finally:
+        if index_task:
+            index_task.cancel()
+        for activity_executor in executors:
+            activity_executor.shutdown(wait=False)
+
+def _run_worker_process(args: argparse.Namespace, index: int = 0):
+    if args.metrics_bind_address:
+        # Each process needs its own port for /metrics
+        host, port = args.metrics_bind_address.rsplit(":", 1)
+        telemetry.configure(f"{host}:{int(port) + index}")
+    asyncio.run(run_worker(args))
+
+def main(argv=None):
+    args = parse_args(argv)
+    processes = args.processes or os.cpu_count() or 1
+    if processes == 1:
+        _run_worker_process(args)
+        return
     
-    # Create worker
-    worker = Worker(
-        client,
-        task_queue=TASK_QUEUE,
-        workflows=[
-            CreateAccountWorkflow,
-            DeleteAccountWorkflow,
-            GetAccountWorkflow,
-            ListAccountsWorkflow,
-            DepositWorkflow,
-            WithdrawWorkflow,
-            TransferWorkflow,
-            HealthCheckWorkflow
-        ],
-        activities=[
-            create_account_activity,
-            delete_account_activity,
-            get_account_activity,
-            list_accounts_activity,
-            deposit_activity,
-            withdraw_activity,
-            transfer_activity,
-            health_check_activity
-        ]
-    )
+    # Each process gets its own event loop, Temporal connection and Mongo
+    # pool; Temporal load-balances the shared task queue across them.
+    context = multiprocessing.get_context("spawn")
+    children = [
+        context.Process(target=_run_worker_process, args=(args, i), name=f"banking-worker-{i}")
+        for i in range(processes)
+    ]
+    for child in children:
+        child.start()
+    logger.info(f"Started {processes} worker processes")
     
-    logger.info("Banking MCP Temporal Worker starting...")
-    logger.info(f"Task queue: {TASK_QUEUE}")
+    def forward(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
     
-    # Start worker
-    await worker.run()
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+    for child in children:
+        child.join()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
@@ -1,13 +1,22 @@
+import asyncio
 from datetime import timedelta
 from temporalio import workflow
 from temporalio.common import RetryPolicy
+from temporalio.exceptions import ActivityError, ApplicationError
 from dataclasses import dataclass
-from typing import Dict, Any, List
-import logging
+from typing import Dict, Any, List, Optional
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# Operations per batch activity; each chunk is one Mongo transaction
+BATCH_CHUNK_SIZE = 500
+
+# AccountWorkflow: queued operations applied per activity, how long an idle
+# entity stays open, and the history length at which it continues as new
+ACCOUNT_BATCH_SIZE = 500
+ACCOUNT_IDLE_TIMEOUT = timedelta(minutes=10)
+ACCOUNT_MAX_HISTORY_EVENTS = 10000
+# ApplicationError type of updates an AccountWorkflow rejects while it drains
+# before continuing as new; callers retry them against the next run
+ACCOUNT_CONTINUING_AS_NEW = "AccountContinuingAsNew"
 
 retry_policy = RetryPolicy(
     initial_interval=timedelta(seconds=1),
@@ -71,24 +80,89 @@ class GetAccountWorkflow:
 @workflow.defn
 class ListAccountsWorkflow:
     @workflow.run
-    async def run(self) -> AccountOperationResult:
+    async def run(self, limit: int = 100, cursor: str = "") -> AccountOperationResult:
         result = await workflow.execute_activity(
             "list_accounts_activity",
+            args=[limit, cursor],
             start_to_close_timeout=timedelta(seconds=30),
             retry_policy=retry_policy
         )
         return AccountOperationResult(
-            success=True,
-            data={"accounts": result}
+            success=result.get("success", False),
+            data=result,
+            error=result.get("error", "")
+        )
+
+@workflow.defn
+class GetTransactionsWorkflow:
+    @workflow.run
+    async def run(self, username: str, since: str = "", limit: int = 100, cursor: str = "") -> AccountOperationResult:
+        result = await workflow.execute_activity(
+            "get_transactions_activity",
+            args=[username, since, limit, cursor],
+            start_to_close_timeout=timedelta(seconds=30),
+            retry_policy=retry_policy
+        )
+        return AccountOperationResult(
+            success=result.get("success", False),
+            data=result,
+            error=result.get("error", "")
+        )
+
+@workflow.defn
+class AccountStatsWorkflow:
+    @workflow.run
+    async def run(self) -> AccountOperationResult:
+        result = await workflow.execute_activity(
+            "get_account_stats_activity",
+            start_to_close_timeout=timedelta(seconds=60),
+            retry_policy=retry_policy
+        )
+        return AccountOperationResult(
+            success=result.get("success", False),
+            data=result,
+            error=result.get("error", "")
+        )
+
+@workflow.defn
+class TopAccountsWorkflow:
+    @workflow.run
+    async def run(self, n: int = 10) -> AccountOperationResult:
+        result = await workflow.execute_activity(
+            "top_accounts_activity",
+            args=[n],
+            start_to_close_timeout=timedelta(seconds=30),
+            retry_policy=retry_policy
+        )
+        return AccountOperationResult(
+            success=result.get("success", False),
+            data=result,
+            error=result.get("error", "")
+        )
+
+@workflow.defn
+class BalanceHistogramWorkflow:
+    @workflow.run
+    async def run(self, buckets: int = 10, boundaries: Optional[List[float]] = None) -> AccountOperationResult:
+        result = await workflow.execute_activity(
+            "balance_histogram_activity",
+            args=[buckets, boundaries],
+            start_to_close_timeout=timedelta(seconds=60),
+            retry_policy=retry_policy
+        )
+        return AccountOperationResult(
+            success=result.get("success", False),
+            data=result,
+            error=result.get("error", "")
         )
 
 @workflow.defn
 class DepositWorkflow:
     @workflow.run
-    async def run(self, username: str, amount: float) -> AccountOperationResult:
+    async def run(self, username: str, amount: float, idempotency_key: str = "") -> AccountOperationResult:
         result = await workflow.execute_activity(
             "deposit_activity",
-            args=[username, amount],
+            args=[username, amount, idempotency_key],
             start_to_close_timeout=timedelta(seconds=30),
             retry_policy=retry_policy
         )
@@ -101,10 +175,10 @@ class DepositWorkflow:
 @workflow.defn
 class WithdrawWorkflow:
     @workflow.run
-    async def run(self, username: str, amount: float) -> AccountOperationResult:
+    async def run(self, username: str, amount: float, idempotency_key: str = "") -> AccountOperationResult:
         result = await workflow.execute_activity(
             "withdraw_activity",
-            args=[username, amount],
+            args=[username, amount, idempotency_key],
             start_to_close_timeout=timedelta(seconds=30),
             retry_policy=retry_policy
         )
@@ -117,10 +191,10 @@ class WithdrawWorkflow:
 @workflow.defn
 class TransferWorkflow:
     @workflow.run
-    async def run(self, from_user: str, to_user: str, amount: float) -> AccountOperationResult:
+    async def run(self, from_user: str, to_user: str, amount: float, idempotency_key: str = "") -> AccountOperationResult:
         result = await workflow.execute_activity(
             "transfer_activity",
-            args=[from_user, to_user, amount],
+            args=[from_user, to_user, amount, idempotency_key],
             start_to_close_timeout=timedelta(seconds=30),
             retry_policy=retry_policy
         )
@@ -130,6 +204,166 @@ class TransferWorkflow:
             error=result.get("error", "")
         )
 
+@workflow.defn
+class AccountWorkflow:
+    """Long-running entity that owns one account's deposits and withdrawals.
+
+    Operations arrive as Updates (usually via update-with-start), are queued
+    in arrival order and applied in batches by one activity each, so the
+    account sees one Mongo write per batch instead of one per operation. The
+    pending query answers from workflow state. Once its history is long
+    enough, the workflow rejects new updates, drains the queue and continues
+    as new, so steady traffic cannot keep it from rolling over. It completes
+    after ACCOUNT_IDLE_TIMEOUT without operations; the next update starts a
+    fresh run.
+    """
+
+    # ``balance`` is accepted but unused, so runs started with it still decode
+    @workflow.init
+    def __init__(self, username: str, balance: Optional[float] = None):
+        self.username = username
+        self.pending = []
+        self.results = {}
+        self.next_operation = 0
+
+    @workflow.run
+    async def run(self, username: str, balance: Optional[float] = None) -> None:
+        if not workflow.patched("account-no-initial-read") and balance is None:
+            # Runs started before the patch read the account first; replay
+            # them unchanged. Remove once none of those runs remain.
+            await workflow.execute_activity(
+                "get_account_activity",
+                args=[username],
+                start_to_close_timeout=timedelta(seconds=30),
+                retry_policy=retry_policy
+            )
+
+        while True:
+            try:
+                await workflow.wait_condition(
+                    lambda: bool(self.pending) or self._history_too_long(),
+                    timeout=ACCOUNT_IDLE_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                pass
+            if self.pending:
+                await self._apply_pending()
+                continue
+            # Let handlers return their results before this run closes
+            await workflow.wait_condition(lambda: workflow.all_handlers_finished() or bool(self.pending))
+            if self.pending:
+                continue
+            if self._history_too_long():
+                workflow.continue_as_new(args=[username])
+            return
+
+    @workflow.update
+    async def deposit(self, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
+        return await self._submit("deposit", amount, idempotency_key)
+
+    @workflow.update
+    async def withdraw(self, amount: float, idempotency_key: str = "") -> Dict[str, Any]:
+        return await self._submit("withdraw", amount, idempotency_key)
+
+    @deposit.validator
+    def validate_deposit(self, amount: float, idempotency_key: str = "") -> None:
+        self._reject_if_draining()
+
+    @withdraw.validator
+    def validate_withdraw(self, amount: float, idempotency_key: str = "") -> None:
+        self._reject_if_draining()
+
+    @workflow.query
+    def get_pending(self) -> Dict[str, Any]:
+        """Operations queued but not yet applied; get_account reads the balance from MongoDB."""
+        return {"username": self.username, "pending": len(self.pending)}
+
+    async def _submit(self, kind: str, amount: float, idempotency_key: str) -> Dict[str, Any]:
+        operation_id = self.next_operation
+        self.next_operation += 1
+        self.pending.append({
+            "id": operation_id,
+            "type": kind,
+            "amount": amount,
+            "idempotency_key": idempotency_key
+        })
+        await workflow.wait_condition(lambda: operation_id in self.results)
+        return self.results.pop(operation_id)
+
+    async def _apply_pending(self):
+        batch, self.pending = self.pending[:ACCOUNT_BATCH_SIZE], self.pending[ACCOUNT_BATCH_SIZE:]
+        try:
+            result = await workflow.execute_activity(
+                "apply_account_operations_activity",
+                args=[
+                    self.username,
+                    [{k: operation[k] for k in ("type", "amount", "idempotency_key")} for operation in batch],
+                    # Deterministic, so a retried activity reuses the same key
+                    f"account-batch:{self.username}:{workflow.uuid4()}"
+                ],
+                start_to_close_timeout=timedelta(seconds=60),
+                retry_policy=retry_policy
+            )
+        except ActivityError as e:
+            # Only non-retryable failures get here; fail the batch, not the workflow
+            result = {"success": False, "error": str(e.cause or e)}
+        if result.get("success"):
+            outcomes = result["results"]
+        else:
+            outcomes = [{"success": False, "error": result.get("error", "")}] * len(batch)
+        for operation, outcome in zip(batch, outcomes):
+            self.results[operation["id"]] = outcome
+
+    def _reject_if_draining(self):
+        # Rejected updates leave no history, so the queue can empty out
+        if self._history_too_long():
+            raise ApplicationError(
+                "Account workflow is continuing as new, retry the update",
+                type=ACCOUNT_CONTINUING_AS_NEW,
+                non_retryable=True
+            )
+
+    def _history_too_long(self) -> bool:
+        info = workflow.info()
+        return info.is_continue_as_new_suggested() or info.get_current_history_length() > ACCOUNT_MAX_HISTORY_EVENTS
+
+async def _run_batch(activity_name: str, operations: List[Dict[str, Any]]) -> AccountOperationResult:
+    # Chunks run in order so later operations see earlier ones' balances
+    results = []
+    for start in range(0, len(operations), BATCH_CHUNK_SIZE):
+        results.extend(await workflow.execute_activity(
+            activity_name,
+            args=[
+                operations[start:start + BATCH_CHUNK_SIZE],
+                # Deterministic, so a chunk that committed before its activity
+                # timed out is not applied again on retry
+                f"{activity_name}:{workflow.uuid4()}"
+            ],
+            start_to_close_timeout=timedelta(seconds=120),
+            retry_policy=retry_policy
+        ))
+    succeeded = sum(1 for result in results if result["success"])
+    return AccountOperationResult(
+        success=True,
+        data={
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded
+        }
+    )
+
+@workflow.defn
+class BatchDepositWorkflow:
+    @workflow.run
+    async def run(self, deposits: List[Dict[str, Any]]) -> AccountOperationResult:
+        return await _run_batch("batch_deposit_activity", deposits)
+
+@workflow.defn
+class BatchTransferWorkflow:
+    @workflow.run
+    async def run(self, transfers: List[Dict[str, Any]]) -> AccountOperationResult:
+        return await _run_batch("batch_transfer_activity", transfers)
+
 @workflow.defn
 class HealthCheckWorkflow:
     @workflow.run
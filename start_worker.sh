@@ -1 +1 @@
-python -m mcp_server.worker
+python -m mcp_server.worker "$@"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Tests for the get_account read-through cache, using the in-memory mongomock backend."""
+
+import os
+import time
+from unittest import mock
+import mongomock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.cache import AccountCache
+from mcp_server.database import Database
+
+
+class FakeSession:
+    """Stands in for a transaction session: writes apply at once, "commit" is when with_transaction returns."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        return callback(self)
+
+
+def cached_database():
+    with mock.patch.dict(os.environ, {"ACCOUNT_CACHE_SIZE": "10", "ACCOUNT_CACHE_TTL_SECONDS": "60"}):
+        db = Database()
+    # mongomock has no sessions; pretend transactions are on so writes join one
+    mongomock.ignore_feature("session")
+    db.use_transactions = True
+    db.client.start_session = FakeSession
+    return db
+
+
+def test_put_is_dropped_after_invalidation():
+    cache = AccountCache(10, 60)
+    generation = cache.generation("alice")
+    cache.invalidate("alice")
+    cache.put("alice", {"username": "alice", "balance": 1.0}, generation)
+    assert cache.get("alice") is None
+
+    generation = cache.generation("alice")
+    cache.put("alice", {"username": "alice", "balance": 2.0}, generation)
+    assert cache.get("alice")["balance"] == 2.0
+
+
+def test_forgotten_generation_still_drops_stale_put():
+    cache = AccountCache(2, 60)
+    generation = cache.generation("alice")
+    # Enough other invalidations to push alice out of the generation map
+    for username in ("alice", "bob", "carol", "dave"):
+        cache.invalidate(username)
+    cache.put("alice", {"username": "alice", "balance": 1.0}, generation)
+    assert cache.get("alice") is None
+
+
+def test_unknown_document_invalidates_reads_in_flight():
+    cache = AccountCache(10, 60)
+    generation = cache.generation("alice")
+    cache.invalidate_id("not-cached")
+    cache.put("alice", {"username": "alice", "balance": 1.0}, generation)
+    assert cache.get("alice") is None
+
+
+def test_entries_expire_and_lru_evicts():
+    cache = AccountCache(2, 0.05)
+    cache.put("alice", {"username": "alice"})
+    time.sleep(0.1)
+    assert cache.get("alice") is None
+
+    cache = AccountCache(2, 60)
+    for username in ("alice", "bob"):
+        cache.put(username, {"username": username})
+    cache.get("alice")
+    cache.put("carol", {"username": "carol"})
+    assert cache.get("bob") is None
+    assert cache.get("alice") is not None and cache.get("carol") is not None
+
+
+def test_invalidation_waits_for_outer_commit():
+    db = cached_database()
+    db.create_account("alice", 10.0)
+    db.get_account("alice")
+
+    def operation(session):
+        db.deposit("alice", 5.0, session=session)
+        # Still inside the transaction: a reader here sees the old committed
+        # balance, so the generation it takes must not let it cache that
+        generation = db.account_cache.generation("alice")
+        db.account_cache.put("alice", {"username": "alice", "balance": 10.0}, generation)
+        return {"success": True}
+
+    db.run_idempotent("deposit:k1", operation)
+    assert db.get_account("alice")["balance"] == 15.0
+    assert not db._pending_invalidations
+
+
+def test_batch_chunk_invalidates_after_commit():
+    db = cached_database()
+    db.create_account("alice", 10.0)
+    db.create_account("bob", 0.0)
+    for username in ("alice", "bob"):
+        db.get_account(username)
+    generations = {}
+
+    def operation(session):
+        db.batch_transfer([("alice", "bob", 4.0)], session=session)
+        generations.update({u: db.account_cache.generation(u) for u in ("alice", "bob")})
+        return []
+
+    db.run_idempotent("chunk:1", operation)
+    for username, generation in generations.items():
+        assert db.account_cache.generation(username) != generation
+    assert db.get_account("alice")["balance"] == 6.0
+    assert db.get_account("bob")["balance"] == 4.0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Tests for the analytics aggregations, using the in-memory mongomock backend."""
+
+import os
+from unittest import mock
+import mongomock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.database import Database
+
+mongomock.ignore_feature("session")
+
+
+def database_with(balances, hot=()):
+    with mock.patch.dict(os.environ, {"HOT_ACCOUNTS": ",".join(hot), "HOT_ACCOUNT_SHARDS": "2"}):
+        db = Database()
+    for i, balance in enumerate(balances):
+        db.create_account(hot[i] if i < len(hot) else f"user{i}", balance)
+    return db
+
+
+def counts(histogram):
+    return [(bucket["min"], bucket["max"], bucket["count"]) for bucket in histogram["buckets"]]
+
+
+def test_explicit_boundaries_are_lower_inclusive():
+    db = database_with([0.0, 9.99, 10.0, 19.99, 20.0, 25.0])
+    histogram = db.balance_histogram(boundaries=[20, 0, 10, 10])
+    assert counts(histogram) == [(0.0, 10.0, 2), (10.0, 20.0, 2)]
+    # 20.00 is the exclusive upper bound, so it falls outside like 25.00
+    assert histogram["other"] == 2
+
+
+def test_equal_width_buckets_include_the_max():
+    db = database_with([0.0, 5.0, 10.0])
+    histogram = db.balance_histogram(buckets=2)
+    assert counts(histogram) == [(0.0, 5.01, 2), (5.01, 10.02, 1)]
+    assert histogram["other"] == 0
+
+
+def test_hot_accounts_are_bucketed_by_logical_balance():
+    db = database_with([0.0, 1.0], hot=("treasury",))
+    db.deposit("treasury", 15.0)
+    histogram = db.balance_histogram(boundaries=[0, 10, 20])
+    assert counts(histogram) == [(0.0, 10.0, 1), (10.0, 20.0, 1)]
+
+
+def test_invalid_boundaries():
+    db = database_with([1.0])
+    for boundaries in ([5], [5, 5.001], [float("nan"), 1]):
+        try:
+            db.balance_histogram(boundaries=boundaries)
+            assert False, f"expected ValueError for {boundaries}"
+        except ValueError:
+            pass
+    assert db.balance_histogram() != {"buckets": [], "other": 0}
+    assert Database().balance_histogram() == {"buckets": [], "other": 0}
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Round-trip tests for the Temporal payload compression codec."""
+
+import asyncio
+from mcp_server import codec
+from mcp_server.codec import CompressionCodec, ZLIB_ENCODING, ZSTD_ENCODING, data_converter
+
+ROWS = [{"username": f"user{i}", "balance": i * 1.5, "timestamp": "2026-10-17T00:00:00Z"} for i in range(200)]
+
+
+def round_trip(converter, value):
+    async def run():
+        payloads = await converter.encode([value])
+        return payloads, await converter.decode(payloads, [type(value)])
+    payloads, decoded = asyncio.run(run())
+    return payloads[0], decoded[0]
+
+
+def test_large_payloads_compress_and_round_trip():
+    algorithms = ["zlib"] + (["zstd"] if codec.zstandard else [])
+    for algorithm in algorithms:
+        payload, decoded = round_trip(data_converter(algorithm, threshold=1024), ROWS)
+        expected = ZSTD_ENCODING if algorithm == "zstd" else ZLIB_ENCODING
+        assert payload.metadata["encoding"] == expected
+        assert decoded == ROWS
+
+
+def test_small_payloads_stay_plain_json():
+    payload, decoded = round_trip(data_converter("zlib", threshold=1024), {"success": True})
+    assert payload.metadata["encoding"] == b"json/plain"
+    assert decoded == {"success": True}
+
+
+def test_decoding_ignores_the_current_setting():
+    # Histories written with compression on must still decode after it is off
+    payloads = data_converter("none").payload_converter.to_payloads([ROWS])
+    async def run():
+        encoded = await CompressionCodec("zlib", threshold=0).encode(payloads)
+        assert encoded[0].metadata["encoding"] == ZLIB_ENCODING
+        return await CompressionCodec("none").decode(encoded)
+    decoded = asyncio.run(run())
+    assert data_converter("none").payload_converter.from_payloads(decoded, [list])[0] == ROWS
+
+
+def test_zstd_without_the_package():
+    if codec.zstandard:
+        return
+    assert CompressionCodec("zstd").algorithm == "zlib"
+    from temporalio.api.common.v1 import Payload
+    try:
+        asyncio.run(CompressionCodec().decode([Payload(metadata={"encoding": ZSTD_ENCODING}, data=b"x")]))
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+
+
+def test_unknown_codec_is_rejected():
+    try:
+        CompressionCodec("lz4")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
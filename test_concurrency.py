@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Concurrency stress test for atomic deposits and withdrawals against MongoDB."""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from mcp_server.database import get_db
+
+PARALLEL_TASKS = int(os.getenv("STRESS_TASKS", "200"))
+USERNAME = "stress-test-account"
+
+async def test_concurrent_deposits_and_withdrawals():
+    """Hammer one account from many tasks and check no update is lost."""
+    db = get_db()
+    db.delete_account(USERNAME)
+    db.create_account(USERNAME, 0.0)
+    # asyncio.to_thread's default pool caps at min(32, cpus + 4) threads,
+    # which would quietly serialize most of the tasks
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=PARALLEL_TASKS * 2)
+
+    try:
+        # N parallel deposits of 1.0 must add up to exactly N
+        print(f"Running {PARALLEL_TASKS} parallel deposits...")
+        await asyncio.gather(*[
+            loop.run_in_executor(executor, db.deposit, USERNAME, 1.0)
+            for _ in range(PARALLEL_TASKS)
+        ])
+        balance = db.get_account(USERNAME)["balance"]
+        print(f"Balance after deposits: {balance}")
+        assert balance == PARALLEL_TASKS, f"Lost updates: expected {PARALLEL_TASKS}, got {balance}"
+
+        # Twice as many withdrawals as there are funds: exactly half succeed
+        # and the balance never goes negative
+        print(f"Running {PARALLEL_TASKS * 2} parallel withdrawals...")
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, db.withdraw, USERNAME, 1.0)
+            for _ in range(PARALLEL_TASKS * 2)
+        ])
+        succeeded = sum(1 for account, _ in results if account)
+        rejected = [error for account, error in results if not account]
+        balance = db.get_account(USERNAME)["balance"]
+        print(f"Withdrawals succeeded: {succeeded}, rejected: {len(rejected)}, balance: {balance}")
+        assert succeeded == PARALLEL_TASKS
+        assert set(rejected) == {"Insufficient funds"}
+        assert balance == 0
+
+        print("\nConcurrency stress test passed!")
+    finally:
+        executor.shutdown()
+        db.delete_account(USERNAME)
+
+
+if __name__ == "__main__":
+    asyncio.run(test_concurrent_deposits_and_withdrawals())
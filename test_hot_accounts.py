@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Tests for striped hot-account balances, using the in-memory mongomock backend."""
+
+import os
+from unittest import mock
+import mongomock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.database import Database
+
+mongomock.ignore_feature("session")
+
+
+def hot_database(shard_balances, account_balance):
+    with mock.patch.dict(os.environ, {"HOT_ACCOUNTS": "treasury", "HOT_ACCOUNT_SHARDS": str(len(shard_balances))}):
+        db = Database()
+    db.create_account("treasury", account_balance)
+    for shard, balance in enumerate(shard_balances):
+        db.account_shards.update_one({"username": "treasury", "shard": shard}, {"$set": {"balance": balance}})
+    return db
+
+
+def balances(db):
+    shards = {s["shard"]: s["balance"] for s in db.account_shards.find({"username": "treasury"})}
+    return db.accounts.find_one({"username": "treasury"})["balance"], [shards[i] for i in sorted(shards)]
+
+
+def test_debit_fits_in_one_shard():
+    db = hot_database([10.0, 10.0, 10.0], 0.0)
+    assert db._debit_hot("treasury", 4.0) == ""
+    account, shards = balances(db)
+    assert sorted(shards) == [6.0, 10.0, 10.0] and account == 0.0
+
+
+def test_debit_borrows_from_fullest_pieces():
+    db = hot_database([10.0, 3.0, 7.0], 5.0)
+    assert db._debit_hot("treasury", 20.0) == ""
+    account, shards = balances(db)
+    # Largest first: shard 0, shard 2, then 3 of the account document's 5
+    assert shards == [0.0, 3.0, 0.0] and account == 2.0
+    assert db.get_account("treasury")["balance"] == 5.0
+
+
+def test_insufficient_funds_changes_nothing():
+    db = hot_database([10.0, 3.0, 7.0], 5.0)
+    assert db._debit_hot("treasury", 25.01) == "Insufficient funds"
+    assert balances(db) == (5.0, [10.0, 3.0, 7.0])
+    assert db._debit_hot("nobody", 1.0) == "Account not found"
+
+
+def test_withdraw_records_logical_balance():
+    db = hot_database([10.0, 10.0], 0.0)
+    account, error = db.withdraw("treasury", 15.0)
+    assert error == "" and account["balance"] == 5.0
+    entry = db.transactions.find_one({"username": "treasury", "type": "withdrawal"})
+    assert entry["balance"] == 5.0
+
+
+def test_fold_refuses_without_transactions():
+    db = hot_database([10.0], 0.0)
+    try:
+        db.fold_account_shards("treasury")
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert balances(db) == (0.0, [10.0])
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Tests for run_idempotent without transactions, using the in-memory mongomock backend."""
+
+import os
+from datetime import datetime, timedelta, timezone
+import mongomock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.database import Database, OperationInProgress, OperationOutcomeUnknown
+
+mongomock.ignore_feature("session")
+
+
+def test_result_is_returned_on_retry():
+    db = Database()
+    db.create_account("alice", 0.0)
+    calls = []
+
+    def deposit(session):
+        calls.append(1)
+        db.deposit("alice", 5.0, session=session)
+        return {"success": True}
+
+    assert db.run_idempotent("deposit:k1", deposit) == {"success": True}
+    assert db.run_idempotent("deposit:k1", deposit) == {"success": True}
+    assert len(calls) == 1
+    assert db.get_account("alice")["balance"] == 5.0
+
+
+def test_failure_after_a_write_keeps_the_claim():
+    db = Database()
+    db.create_account("alice", 0.0)
+
+    def deposit_then_fail(session):
+        db.deposit("alice", 5.0, session=session)
+        raise RuntimeError("connection reset")
+
+    for _ in range(2):
+        try:
+            db.run_idempotent("deposit:k2", deposit_then_fail)
+            assert False, "expected OperationOutcomeUnknown"
+        except OperationOutcomeUnknown as e:
+            assert "connection reset" in str(e)
+    assert db.get_account("alice")["balance"] == 5.0
+
+
+def test_held_claim_is_in_progress_until_abandoned():
+    db = Database()
+    db.idempotency_keys.insert_one({"_id": "deposit:k3", "created_at": datetime.now(timezone.utc)})
+    try:
+        db.run_idempotent("deposit:k3", lambda session: {"success": True})
+        assert False, "expected OperationInProgress"
+    except OperationInProgress:
+        pass
+
+    stale = datetime.now(timezone.utc) - timedelta(seconds=db.idempotency_claim_timeout + 1)
+    db.idempotency_keys.update_one({"_id": "deposit:k3"}, {"$set": {"created_at": stale}})
+    try:
+        db.run_idempotent("deposit:k3", lambda session: {"success": True})
+        assert False, "expected OperationOutcomeUnknown"
+    except OperationOutcomeUnknown:
+        pass
+
+
+def test_duplicate_key_inside_operation_is_not_in_progress():
+    db = Database()
+    db.ensure_indexes()
+    db.create_account("alice", 0.0)
+    try:
+        db.run_idempotent("create:k4", lambda session: db.accounts.insert_one(
+            {"username": "alice", "balance": 0.0}, session=session))
+        assert False, "expected OperationOutcomeUnknown"
+    except OperationOutcomeUnknown as e:
+        assert "duplicate" in str(e).lower()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
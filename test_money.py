@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Tests for exact money handling, using the in-memory mongomock backend."""
+
+import os
+from decimal import Decimal
+import mongomock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.activities import _invalid_batch_item
+from mcp_server.database import Database
+from mcp_server.models import amount_error, to_money
+
+mongomock.ignore_feature("session")
+
+
+def test_rounds_half_even_to_cents():
+    assert to_money(0.1) == Decimal("0.10")
+    assert to_money(0.125) == Decimal("0.12")
+    assert to_money(0.135) == Decimal("0.14")
+    assert to_money("2.675") == Decimal("2.68")
+    assert to_money(3) == Decimal("3.00")
+
+
+def test_float_sums_stay_exact():
+    assert to_money(0.1) + to_money(0.2) == to_money(0.3)
+
+
+def test_non_finite_amounts_are_value_errors():
+    for value in (float("nan"), float("inf"), float("-inf"), "abc"):
+        try:
+            to_money(value)
+            assert False, f"expected ValueError for {value!r}"
+        except ValueError:
+            pass
+    assert "finite" in amount_error(float("nan"))
+    assert amount_error(0.004) == "Amount must be positive"
+    assert amount_error(0.01) == ""
+    assert _invalid_batch_item({"username": "alice", "amount": float("inf")}, ["username"])
+
+
+def test_account_operations_reject_nan_per_operation():
+    db = Database()
+    db.create_account("alice", 10.0)
+    applied = db.apply_account_operations("alice", [
+        {"type": "deposit", "amount": float("nan"), "idempotency_key": ""},
+        {"type": "withdraw", "amount": 2.5, "idempotency_key": ""},
+    ])
+    assert not applied["results"][0]["success"]
+    assert applied["results"][1]["success"]
+    assert db.get_account("alice")["balance"] == 7.5
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
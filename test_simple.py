@@ -2,6 +2,7 @@
 """Simple test for the Temporal-based MCP server."""
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from mcp_server.workflows import HealthCheckWorkflow
 from mcp_server.activities import health_check_activity
 from temporalio.client import Client
@@ -19,7 +20,8 @@ async def test_temporal_directly():
         client,
         task_queue="banking-task-queue",
         workflows=[HealthCheckWorkflow],
-        activities=[health_check_activity]
+        activities=[health_check_activity],
+        activity_executor=ThreadPoolExecutor(max_workers=1)
     )
     
     # Run workflow
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Tests for detecting whether MongoDB can run transactions, using mongomock."""
+
+import os
+from unittest import mock
+
+os.environ["MONGO_URI"] = "mongomock://"
+
+from mcp_server.database import Database
+
+
+def database_answering(hello):
+    db = Database()
+    db._use_transactions = None
+    db.client.admin.command = mock.Mock(return_value=hello)
+    return db
+
+
+def test_standalone_falls_back_without_transactions():
+    db = database_answering({"isWritablePrimary": True})
+    assert db.use_transactions is False
+    db.create_account("alice", 10.0)
+    assert db.get_account("alice")["balance"] == 10.0
+
+
+def test_replica_set_and_mongos_use_transactions():
+    for hello in ({"isWritablePrimary": True, "setName": "rs0"}, {"msg": "isdbgrid"}):
+        db = database_answering(hello)
+        assert db.use_transactions is True
+        assert db.use_transactions is True
+        db.client.admin.command.assert_called_once_with("hello")
+
+
+def test_unreachable_server_is_asked_again():
+    db = database_answering(None)
+    db.client.admin.command.side_effect = [ConnectionError("down"), {"setName": "rs0"}]
+    try:
+        db.use_transactions
+        assert False, "expected ConnectionError"
+    except ConnectionError:
+        pass
+    assert db.use_transactions is True
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")